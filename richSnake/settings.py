@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 
@@ -19,6 +20,9 @@ from dotenv import load_dotenv
 # Load the .env file
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = 10  # seconds, per Bot API call
+TELEGRAM_RETRIES = 2
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -144,9 +148,71 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'richSnake_app.authentication.CachedTokenAuthentication',
+        'richSnake_app.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Optional
     ),
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# When enabled, auth_view also returns short-lived signed JWT access/refresh
+# tokens ("Authorization: Bearer <access>"). Authtoken keys keep working.
+AUTH_ISSUE_JWT = False
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
+# Serve leaderboard ranks from an in-process index instead of count queries.
+# Each worker builds its copy on first use, then checks it against the database
+# and rebuilds it every LEADERBOARD_REBUILD_INTERVAL seconds. Staff can run
+# the check in the worker serving a request at /leaderboard_check/.
+LEADERBOARD_IN_MEMORY = False
+LEADERBOARD_REBUILD_INTERVAL = 600
+
+# Rendered top-100 leaderboards are shared between workers through the cache,
+# so it has to be a backend every process can see. Per-user entries (token
+# versions, subscription state, invoice links) go to their own cache, so
+# culling them never evicts the shared version counters and snapshots.
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'users': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'users'),
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
+}
+USER_CACHE_ALIAS = 'users'
+
+# Seconds a leaderboard snapshot may still be served after a newer score write.
+LEADERBOARD_SNAPSHOT_STALENESS = 30
+
+# Buffer update_user_score results in memory and write them in batches.
+SCORE_WRITE_BEHIND = False
+SCORE_FLUSH_INTERVAL = 2
+SCORE_BUFFER_MAX_USERS = 1000
+
+# Seconds a user's subscription state is cached (changes invalidate it sooner)
+SUBSCRIPTION_CACHE_TTL = 3600
+
+# Seconds buy_subscription_telegram waits for a new invoice link before answering 202
+INVOICE_LINK_TIMEOUT = 3
+# Seconds a pending payment's invoice link is cached for reuse
+INVOICE_LINK_CACHE_TTL = 86400
+
+# Levels of the referral tree kept in ReferralPath (1 = direct invitees only)
+REFERRAL_TREE_MAX_DEPTH = 3
+# Seconds the top_referrers/ ranking is cached
+TOP_REFERRERS_CACHE_TTL = 60
+
+# Token -> user cache used by CachedTokenAuthentication
+TOKEN_CACHE_TTL = 30  # seconds
+TOKEN_CACHE_SIZE = 10000
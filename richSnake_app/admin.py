@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import User, Prize, Task, Referral, ReferredUser, UserTask, Subscription, WithdrawRequest
+from .models import User, Prize, Task, Referral, ReferredUser, ReferralPath, UserTask, Subscription, WithdrawRequest
 from django.utils.html import format_html
+from .images import image_url
 # Register your models here.
 
 admin.site.register(Subscription)
@@ -13,7 +14,7 @@ class UserAdmin(admin.ModelAdmin):
 
     def photo_thumbnail(self, obj):
         if obj.avatar:
-            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(obj.avatar.url))
+            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(image_url(obj.avatar, 'small')))
         return 'No image'
 
     photo_thumbnail.short_description = 'Photo'
@@ -25,7 +26,7 @@ class PrizeAdmin(admin.ModelAdmin):
 
     def photo_thumbnail(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(obj.image.url))
+            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(image_url(obj.image, 'small')))
         return 'No image'
 
     photo_thumbnail.short_description = 'Image'
@@ -42,7 +43,7 @@ class TaskAdmin(admin.ModelAdmin):
 
     def photo_thumbnail(self, obj):
         if obj.source_image:
-            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(obj.source_image.url))
+            return format_html('<img src="{}" style="width:50px; height:50px; border-radius:10px; object-fit: cover;" />'.format(image_url(obj.source_image, 'small')))
         return 'No image'
 
     photo_thumbnail.short_description = 'Source_image'
@@ -57,6 +58,12 @@ class ReferredUserAdmin(admin.ModelAdmin):
     list_display = ['referred_by', 'referred_user']
 
 
+class ReferralPathAdmin(admin.ModelAdmin):
+    list_display = ['ancestor', 'descendant', 'depth']
+    list_filter = ['depth']
+    raw_id_fields = ['ancestor', 'descendant']
+
+
 class UserTaskAdmin(admin.ModelAdmin):
     list_display_links = ['user']
     list_display = ['user', 'task']
@@ -68,4 +75,5 @@ admin.site.register(Task, TaskAdmin)
 admin.site.register(Referral, ReferralAdmin)
 admin.site.register(ReferredUser, ReferredUserAdmin)
 admin.site.register(UserTask, UserTaskAdmin)
+admin.site.register(ReferralPath, ReferralPathAdmin)
 admin.site.register(WithdrawRequest)
\ No newline at end of file
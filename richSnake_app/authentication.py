@@ -0,0 +1,161 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def _cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _version_key(user_id):
+    return f"user-version:{user_id}"
+
+
+def user_version(user_id):
+    """Shared change stamp of `user_id`, replaced by every process that writes the user.
+
+    Stamps are random rather than counted, so one lost from the cache comes
+    back as a new value instead of repeating one an old entry was stored with.
+    """
+    return _cache().get_or_set(_version_key(user_id), lambda: uuid.uuid4().hex, timeout=None)
+
+
+def bump_user_version(user_id):
+    _cache().set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+class _TokenCache:
+    """Bounded LRU of token key -> (user, token) with a time-to-live.
+
+    Each entry remembers the user's shared version stamp when it was cached,
+    and a hit only counts while the stamp is unchanged, so a write by any
+    worker invalidates the entry everywhere.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, user, token, version)
+        self._keys_by_user = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+        if user_version(entry[1].pk) != entry[3]:
+            self.invalidate_key(key)
+            return None
+        return entry[1], entry[2]
+
+    def set(self, key, user, token, version):
+        ttl = getattr(settings, 'TOKEN_CACHE_TTL', 30)
+        max_size = getattr(settings, 'TOKEN_CACHE_SIZE', 10000)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, user, token, version)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > max_size:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[1].pk]
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+
+token_cache = _TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that remembers token -> user for TOKEN_CACHE_TTL seconds.
+
+    Entries are dropped when the token is deleted or the user is saved (see
+    signals.py and leaderboard.record_change), in this process directly and
+    in other workers through the shared version stamp. Each request gets its
+    own copy of the cached user.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            # The user id is only known after the lookup; a write landing between
+            # the two reads can keep this entry stale until TOKEN_CACHE_TTL at most
+            token_cache.set(key, user, token, user_version(user.pk))
+        else:
+            user, token = cached
+        return copy.copy(user), token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Stateless signed access tokens (``Authorization: Bearer <access>``).
+
+    The signature and expiry are checked without the database, and the user
+    comes from the same cache as CachedTokenAuthentication, so a warm request
+    needs no query at all.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        key = f"jwt-user:{user_id}"
+        cached = token_cache.get(key)
+        if cached is None:
+            # Stamp read before the user, so a concurrent write can only make the entry look stale
+            version = user_version(user_id)
+            user = super().get_user(validated_token)
+            token_cache.set(key, user, None, version)
+        else:
+            user = cached[0]
+        return copy.copy(user)
+
+
+def jwt_enabled():
+    return getattr(settings, 'AUTH_ISSUE_JWT', False)
+
+
+def issue_jwt(user):
+    """Access and refresh tokens for `user`."""
+    refresh = RefreshToken.for_user(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+def invalidate_user(user_id):
+    token_cache.invalidate_user(user_id)
+    bump_user_version(user_id)
+
+
+def invalidate_token(key, user_id=None):
+    token_cache.invalidate_key(key)
+    if user_id is not None:
+        bump_user_version(user_id)
@@ -0,0 +1,224 @@
+"""Inbox for Bot API updates (payments) and the logic that handles them.
+
+The webhook only `store`s each update and answers at once; `process_pending`
+(run by the `process_bot_updates` command) handles stored updates in
+batches. Updates are keyed by update_id and payments are locked while they
+are completed, so redelivered or replayed updates have no further effect.
+
+Without a public webhook, `Poller` (the `poll_bot_updates` command) fetches
+updates with getUpdates instead and feeds them through the same inbox.
+"""
+import threading
+import time
+import traceback
+
+from django.db import transaction
+from django.utils import timezone
+
+from richSnake_app import subscriptions
+from richSnake_app.helpers import forget_invoice
+from richSnake_app.models import BotPollState, BotUpdate, Payment
+from richSnake_app.telegram import TelegramError, get_client
+
+MAX_ATTEMPTS = 3
+# Update types the app acts on; successful payments arrive as messages
+ALLOWED_UPDATES = ['pre_checkout_query', 'message']
+# Telegram picks a random next update_id after a week without updates, so an
+# older offset could confirm (and drop) new updates with lower ids
+OFFSET_TRUST = timezone.timedelta(days=6)
+
+
+def store(updates):
+    """Add raw updates to the inbox, skipping update_ids already stored."""
+    BotUpdate.objects.bulk_create(
+        [BotUpdate(update_id=update['update_id'], payload=update) for update in updates],
+        ignore_conflicts=True,
+    )
+
+
+def complete_payment(order_id):
+    """Mark the payment named by an invoice payload as paid and extend the subscription.
+
+    Returns False if the payment was already completed.
+    """
+    user_tg_id, payment_id = order_id.split("&&&")
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().select_related('user').get(
+            order_id=user_tg_id, id=int(payment_id))
+        if payment.status == Payment.PaymentStatus.COMPLETED:
+            print(f'[payment already marked as paid]: {order_id}')
+            return False
+        payment.status = Payment.PaymentStatus.COMPLETED
+        payment.save(update_fields=['status', 'updated_at'])
+        # After commit, so a concurrent create_invoice cannot cache the link again
+        transaction.on_commit(lambda: forget_invoice(payment))
+        subscription = subscriptions.grant(payment.user, days=30)
+    print(f"[purchase successfull]: {payment.user.username} - {subscription.expire_time}")
+    return True
+
+
+def handle_update(update, done=None):
+    """Act on one update. Raises on errors worth retrying.
+
+    `done` is called in the same transaction as the update's database
+    changes; Telegram calls are made outside any transaction.
+    """
+    if 'pre_checkout_query' in update:
+        query_id = update['pre_checkout_query'].get('id')
+        if query_id:
+            get_client().answer_pre_checkout_query(query_id, ok=True)
+        if done:
+            done()
+        return
+
+    order_id = update.get('message', {}).get('successful_payment', {}).get('invoice_payload')
+    with transaction.atomic():
+        if order_id:
+            try:
+                complete_payment(order_id)
+            except (ValueError, Payment.DoesNotExist) as e:
+                # Malformed or unknown payload: retrying will not help
+                print("[error, data not valid]", order_id, str(e))
+        if done:
+            done()
+
+
+def _claim(batch_size):
+    """Mark up to `batch_size` pending updates as processing; returns only the ones this call won."""
+    now = timezone.now()
+    ids = list(BotUpdate.objects
+               .filter(status=BotUpdate.Status.PENDING)
+               .order_by('update_id')
+               .values_list('update_id', flat=True)[:batch_size])
+    claimed = []
+    for update_id in ids:
+        # Conditional update so concurrent workers never handle the same update twice
+        if BotUpdate.objects.filter(update_id=update_id, status=BotUpdate.Status.PENDING).update(
+                status=BotUpdate.Status.PROCESSING, claimed_at=now):
+            claimed.append(update_id)
+    return list(BotUpdate.objects.filter(update_id__in=claimed).order_by('update_id'))
+
+
+def process_pending(batch_size=100):
+    """Handle up to `batch_size` stored updates in update_id order. Returns (done, failed)."""
+    done = failed = 0
+    for row in _claim(batch_size):
+        def finish(row=row):
+            row.status = BotUpdate.Status.DONE
+            row.processed_at = timezone.now()
+            row.save(update_fields=['status', 'processed_at'])
+
+        try:
+            handle_update(row.payload, done=finish)
+        except Exception as e:
+            row.attempts += 1
+            row.last_error = f"{e!r}\n{traceback.format_exc()}"
+            if row.attempts >= MAX_ATTEMPTS:
+                row.status = BotUpdate.Status.FAILED
+                row.processed_at = timezone.now()
+            else:
+                row.status = BotUpdate.Status.PENDING
+            row.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+            failed += 1
+            print(f"[bot update failed]: {row} - {e}")
+        else:
+            done += 1
+    return done, failed
+
+
+def requeue_stuck(older_than=600):
+    """Return updates left processing by a crashed worker to the inbox."""
+    cutoff = timezone.now() - timezone.timedelta(seconds=older_than)
+    return BotUpdate.objects.filter(status=BotUpdate.Status.PROCESSING, claimed_at__lt=cutoff).update(
+        status=BotUpdate.Status.PENDING)
+
+
+class Poller:
+    """Long-polls getUpdates and hands each batch to the inbox.
+
+    The offset is saved in BotPollState after every batch, so a restart
+    neither skips nor repeats updates. It is only sent while the last update
+    is under OFFSET_TRUST old; otherwise getUpdates is called without one and
+    returns whatever Telegram still holds. `counters()` reports throughput
+    and how far behind Telegram the handled updates were.
+    """
+
+    state_name = 'getUpdates'
+
+    def __init__(self, client=None, batch_size=100, timeout=25, retry_delay=1.0):
+        self.client = client or get_client()
+        self.batch_size = min(batch_size, 100)  # getUpdates maximum
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.offset = None
+        self.last_update_at = None
+        self._resumed = False
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._counters = {'polls': 0, 'empty_polls': 0, 'poll_errors': 0, 'received': 0,
+                          'handled': 0, 'failed': 0, 'last_lag_seconds': None, 'max_lag_seconds': 0.0}
+
+    def _resume(self):
+        state = BotPollState.objects.filter(name=self.state_name).first()
+        if state is not None:
+            self.offset, self.last_update_at = state.offset, state.last_update_at
+            return
+        # First run: continue after the inbox, if it was filled recently
+        last = BotUpdate.objects.order_by('-update_id').values('update_id', 'received_at').first()
+        if last is not None:
+            self.offset, self.last_update_at = last['update_id'] + 1, last['received_at']
+
+    def current_offset(self):
+        if not self._resumed:
+            self._resume()
+            self._resumed = True
+        if self.last_update_at is None or timezone.now() - self.last_update_at > OFFSET_TRUST:
+            return None
+        return self.offset
+
+    def _advance(self, updates):
+        self.offset = max(update['update_id'] for update in updates) + 1
+        self.last_update_at = timezone.now()
+        BotPollState.objects.update_or_create(
+            name=self.state_name, defaults={'offset': self.offset, 'last_update_at': self.last_update_at})
+
+    def poll_once(self):
+        """Fetch one batch, store and handle it. Returns the number of updates received."""
+        try:
+            updates = self.client.get_updates(self.current_offset(), self.batch_size, self.timeout, ALLOWED_UPDATES)
+        except TelegramError as e:
+            self._count(poll_errors=1)
+            print(f"[getUpdates failed]: {e}")
+            time.sleep(self.retry_delay)
+            return 0
+
+        if updates:
+            store(updates)
+            self._advance(updates)
+        done = failed = 0
+        while True:
+            batch_done, batch_failed = process_pending(self.batch_size)
+            done, failed = done + batch_done, failed + batch_failed
+            if batch_done + batch_failed < self.batch_size:
+                break
+
+        now = time.time()
+        lags = [now - update['message']['date'] for update in updates if 'date' in update.get('message', {})]
+        self._count(polls=1, empty_polls=not updates, received=len(updates), handled=done, failed=failed, lags=lags)
+        return len(updates)
+
+    def _count(self, lags=(), **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+            if lags:
+                self._counters['last_lag_seconds'] = lags[-1]
+                self._counters['max_lag_seconds'] = max(self._counters['max_lag_seconds'], *lags)
+
+    def counters(self):
+        with self._lock:
+            counters = dict(self._counters)
+        elapsed = time.monotonic() - self._started
+        counters['updates_per_second'] = counters['received'] / elapsed if elapsed else 0.0
+        counters['offset'] = self.offset
+        return counters
@@ -0,0 +1,139 @@
+"""Pre-rendered, per-locale task and prize catalog payloads.
+
+Each worker renders a catalog to JSON bytes once per (language, image size)
+and keeps it until a Task or Prize is saved or deleted. Edits write a new
+random version token to the shared Django cache, so every worker re-renders
+on its next request; a token lost from the cache is replaced by a new one
+rather than restarting a counter, so an old version is never seen twice.
+Payloads carry strong ETags derived from their bytes, so clients holding an
+up-to-date copy get `304 Not Modified`.
+"""
+import hashlib
+import threading
+import uuid
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from richSnake_app.models import Prize, Task, UserTask
+
+LANGUAGES = ('en', 'ru')
+DEFAULT_LANGUAGE = 'en'
+
+# Fields holding the Russian variant of a base field
+_RU_FIELDS = {'title': 'title_ru', 'description': 'description_ru'}
+
+
+def requested_language(request):
+    """Language from `?lang=`, else the best Accept-Language match, else the default."""
+    lang = request.query_params.get('lang')
+    if lang in LANGUAGES:
+        return lang
+
+    choices = []
+    for part in request.META.get('HTTP_ACCEPT_LANGUAGE', '').split(','):
+        tag, _, params = part.strip().partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        choices.append((quality, tag.split('-')[0].lower()))
+    for quality, tag in sorted(choices, key=lambda choice: -choice[0]):
+        if quality > 0 and tag in LANGUAGES:
+            return tag
+    return DEFAULT_LANGUAGE
+
+
+def localize(data, lang):
+    """Copy of serialized `data` with only the `lang` variant of translated fields."""
+    data = dict(data)
+    for field, ru_field in _RU_FIELDS.items():
+        if ru_field in data:
+            translated = data.pop(ru_field)
+            if lang == 'ru' and translated:
+                data[field] = translated
+    return data
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()[:32]
+
+
+class _Catalog:
+    def __init__(self, name, render):
+        self.version_key = f'catalog:{name}:version'
+        self.render = render
+        self._lock = threading.Lock()
+        self._rendered = {}  # (lang, image_size) -> (version, payload)
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._rendered.clear()
+
+    def get(self, lang=DEFAULT_LANGUAGE, image_size=None):
+        version = cache.get_or_set(self.version_key, lambda: uuid.uuid4().hex, timeout=None)
+        key = (lang, image_size)
+        with self._lock:
+            cached = self._rendered.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        payload = self.render(lang, image_size)
+        with self._lock:
+            self._rendered[key] = (version, payload)
+        return payload
+
+
+def _render_tasks(lang, image_size):
+    """[(task_id, task JSON bytes), ...] in id order, plus a digest of them all."""
+    from richSnake_app.serializers import TaskSerializer
+
+    renderer = JSONRenderer()
+    tasks = TaskSerializer(Task.objects.order_by('id'), many=True, context={'image_size': image_size}).data
+    entries = [(item['id'], renderer.render(localize(item, lang))) for item in tasks]
+    return entries, _digest(*(chunk for _, chunk in entries))
+
+
+def _render_prizes(lang, image_size):
+    """Full prize list response body and its ETag."""
+    from richSnake_app.serializers import PrizeSerializer
+
+    prizes = PrizeSerializer(Prize.objects.order_by('id'), many=True, context={'image_size': image_size}).data
+    body = JSONRenderer().render({'prize_list': [localize(item, lang) for item in prizes]})
+    return body, f'"p-{_digest(body)}"'
+
+
+tasks = _Catalog('tasks', _render_tasks)
+prizes = _Catalog('prizes', _render_prizes)
+
+
+def invalidate_tasks():
+    tasks.invalidate()
+
+
+def invalidate_prizes():
+    prizes.invalidate()
+
+
+def task_board_etag(user, lang=DEFAULT_LANGUAGE, image_size=None):
+    """(etag, completed task ids) for `user`'s task board, using one query."""
+    done = sorted(UserTask.objects.filter(user=user).values_list('task_id', flat=True))
+    _, catalog_digest = tasks.get(lang, image_size)
+    done_digest = _digest(','.join(map(str, done)).encode())
+    return f'"t-{catalog_digest}-{done_digest}"', set(done)
+
+
+def render_task_board(done, lang=DEFAULT_LANGUAGE, image_size=None):
+    """Response body splitting the catalog into completed and incomplete tasks."""
+    entries, _ = tasks.get(lang, image_size)
+    completed = [chunk for task_id, chunk in entries if task_id in done]
+    incomplete = [chunk for task_id, chunk in entries if task_id not in done]
+    return b''.join([
+        b'{"completed_tasks":[', b','.join(completed),
+        b'],"incomplete_tasks":[', b','.join(incomplete),
+        b']}',
+    ])
@@ -1,10 +1,22 @@
 import hashlib
 import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from decimal import Decimal
+from functools import lru_cache
 from urllib.parse import unquote
 from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
 from richSnake_app.models import Payment
 
-import requests
+from richSnake_app.images import generate_derivatives
+from richSnake_app.media import save_content_addressed
+from richSnake_app.telegram import TelegramError, get_client
 
 def validate_init_data(init_data: str, bot_token: str):
     vals = {k: unquote(v) for k, v in [s.split('=', 1)
@@ -18,84 +30,194 @@ def validate_init_data(init_data: str, bot_token: str):
     return h.hexdigest() == vals['hash']
 
 
-def get_telegram_user_photo(telegram_id, bot_token):
-    """Fetches the Telegram user's avatar photo URL."""
-    try:
-
-        TELEGRAM_API_URL = f"https://api.telegram.org/bot{bot_token}"
-        # Step 1: Request user's profile photos
-        response = requests.get(f"{TELEGRAM_API_URL}/getUserProfilePhotos", params={
-            "user_id": telegram_id,
-            "limit": 1  # Fetch only the first photo
-        })
-        response.raise_for_status()  # Raises HTTPError for bad responses
-
-        # Parse JSON response
-        data = response.json()
-        if data.get("ok") and data["result"]["total_count"] > 0:
-            # Get the file ID of the user's photo
-            file_id = data["result"]["photos"][0][0]["file_id"]
-
-            # Step 2: Request the file path using the file ID
-            file_response = requests.get(
-                f"{TELEGRAM_API_URL}/getFile", params={"file_id": file_id})
-            file_response.raise_for_status()
-
-            # Parse JSON response for file data
-            file_data = file_response.json()
-            if file_data.get("ok"):
-                # Construct and return the file URL
-                file_path = file_data["result"]["file_path"]
-                return f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
-
-    except requests.RequestException as e:
-        # Log or handle network issues here
-        print("Network error:", e)
-    except ValueError as e:
-        # Handle JSON decode error if the response isn't JSON
-        print("JSON decoding error:", e)
-
-    # Return None if no photo is found or if any error occurs
+class InitDataError(ValueError):
+    pass
+
+
+class InitDataExpired(InitDataError):
+    pass
+
+
+class InitDataVerifier:
+    """Verifies Telegram WebApp initData.
+
+    The WebAppData secret is derived once per bot token, initData is parsed a
+    single time, and recently verified initData strings are remembered until
+    they expire, so repeated app launches skip the HMAC and JSON work.
+    """
+
+    def __init__(self, bot_token, max_age=86400, cache_size=4096):
+        self.secret_key = hmac.new("WebAppData".encode(), bot_token.encode(), hashlib.sha256).digest()
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._verified = OrderedDict()  # init_data -> (expires_at, fields)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse(init_data):
+        try:
+            return {k: unquote(v) for k, v in [s.split('=', 1) for s in init_data.split('&')]}
+        except ValueError:
+            raise InitDataError("Malformed initData")
+
+    def verify(self, init_data):
+        """Return the initData fields with `user` decoded, or raise InitDataError."""
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(init_data)
+            if cached is not None:
+                if cached[0] > now:
+                    self._verified.move_to_end(init_data)
+                    return cached[1]
+                del self._verified[init_data]
+
+        fields = self.parse(init_data)
+        try:
+            auth_date = int(fields.get("auth_date", 0))
+        except ValueError:
+            raise InitDataError("Malformed auth_date")
+        expires_at = auth_date + self.max_age
+        if now > expires_at:
+            raise InitDataExpired("Session expired")
+
+        data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(fields.items()) if k != 'hash')
+        expected = hmac.new(self.secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected.encode(), fields.get('hash', '').encode()):
+            raise InitDataError("Invalid authentication data")
+
+        try:
+            fields['user'] = json.loads(fields['user'])
+        except (KeyError, ValueError):
+            raise InitDataError("Missing user data")
+
+        with self._lock:
+            self._verified[init_data] = (expires_at, fields)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return fields
+
+
+@lru_cache(maxsize=4)
+def get_init_data_verifier(bot_token):
+    """Process-wide verifier for `bot_token`."""
+    return InitDataVerifier(bot_token)
+
+
+def get_telegram_user_photo_info(telegram_id, bot_token):
+    """The first size of the user's current profile photo, or None."""
+    photos = get_client(bot_token).get_user_profile_photos(telegram_id, limit=1)
+    if photos["total_count"] > 0:
+        return photos["photos"][0][0]
     return None
 
 
-def create_invoice(user, amount=50) -> dict:
-    o_id = user.telegram_id
-
-    payment = Payment.objects.create(
-        user=user,
-        amount=amount,
-        order_id=o_id,
-        payment_method="telegram"
-    )
-
-    o_id = str(o_id) + "&&&" + str(payment.id)
-    print(f"[order_id]: {o_id}")
-    data = {
-        "title": "Rich Snake",
-        "description": "Subscription for Rich Snake",
-        "payload": o_id,
-        "provider_token": "",  # Token from BotFather
-        "currency": "XTR",
-        "prices": [
-            {"label": "Telegram Stars", "amount": amount}
-        ]
-    }
-
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/createInvoiceLink"
-    response = requests.post(url, json=data, headers=headers)
-
-    # Process the response
-    if 200 <= response.status_code < 300:
-        response_data = response.json()
-        if response_data['ok']:
-            return {"url": response_data['result']}
-        else:
-            raise Exception(f"Invoice creation failed: {response_data['description']}")
-    else:
-        raise Exception(f"Error: {response.status_code}; Body: {response.text}; Data: {data}")
+def refresh_user_avatar(telegram_id):
+    """Store the user's current Telegram avatar in User.avatar.
+
+    Nothing is downloaded when Telegram's file_unique_id matches the photo we
+    already have, and images are stored content-addressed so identical bytes
+    share one file. Raises on API errors so the background job is retried.
+    """
+    from richSnake_app.models import User
+
+    client = get_client()
+    photo = get_telegram_user_photo_info(telegram_id, settings.BOT_TOKEN)
+    if photo is None:
+        return
+
+    user = User.objects.get(telegram_id=telegram_id)
+    if user.avatar and user.avatar_file_unique_id == photo["file_unique_id"]:
+        return
+
+    file_data = client.get_file(photo["file_id"])
+    content = client.download(client.file_url(file_data["file_path"]))
+
+    user.avatar.name = save_content_addressed(content, 'avatars')
+    user.avatar_file_unique_id = photo["file_unique_id"]
+    user.save(update_fields=['avatar', 'avatar_file_unique_id'])
+    generate_derivatives(user.avatar.name)
+
+
+_invoice_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='invoice-link')
+_invoice_lock = threading.Lock()
+_invoice_futures = {}  # payment id -> Future of its link
 
+
+def _cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _invoice_cache_key(user_id, amount):
+    return f"invoice:{user_id}:{Decimal(amount):.2f}"
+
+
+def _create_invoice_link(payment, amount):
+    close_old_connections()
+    try:
+        o_id = str(payment.order_id) + "&&&" + str(payment.id)
+        print(f"[order_id]: {o_id}")
+        data = {
+            "title": "Rich Snake",
+            "description": "Subscription for Rich Snake",
+            "payload": o_id,
+            "provider_token": "",  # Token from BotFather
+            "currency": "XTR",
+            "prices": [
+                {"label": "Telegram Stars", "amount": amount}
+            ]
+        }
+        try:
+            url = get_client().create_invoice_link(**data)
+        except TelegramError as e:
+            raise Exception(f"Invoice creation failed: {e.description}; Data: {data}")
+
+        Payment.objects.filter(id=payment.id).update(invoice_link=url)
+        _cache().set(_invoice_cache_key(payment.user_id, amount), url,
+                     timeout=getattr(settings, 'INVOICE_LINK_CACHE_TTL', 86400))
+        return url
+    finally:
+        with _invoice_lock:
+            _invoice_futures.pop(payment.id, None)
+        close_old_connections()
+
+
+def forget_invoice(payment):
+    """Stop handing out `payment`'s link, e.g. once it has been paid."""
+    _cache().delete(_invoice_cache_key(payment.user_id, payment.amount))
+
+
+def create_invoice(user, amount=50) -> dict:
+    """Invoice link for `user`, reusing the one of their pending payment of `amount`.
+
+    A new link is created in a worker thread. If Telegram does not answer
+    within INVOICE_LINK_TIMEOUT seconds, returns {"url": None, "pending": True};
+    the link is stored once it arrives and served on the next call.
+    """
+    url = _cache().get(_invoice_cache_key(user.pk, amount))
+    if url:
+        return {"url": url}
+
+    payment = (Payment.objects
+               .filter(user=user, amount=amount, status=Payment.PaymentStatus.PENDING,
+                       payment_method=Payment.PaymentMethod.TELEGRAM)
+               .order_by('-created_at').first())
+    if payment is None:
+        payment = Payment.objects.create(
+            user=user,
+            amount=amount,
+            order_id=user.telegram_id,
+            payment_method="telegram"
+        )
+    elif payment.invoice_link:
+        _cache().set(_invoice_cache_key(user.pk, amount), payment.invoice_link,
+                     timeout=getattr(settings, 'INVOICE_LINK_CACHE_TTL', 86400))
+        return {"url": payment.invoice_link}
+
+    with _invoice_lock:
+        future = _invoice_futures.get(payment.id)
+        if future is None:
+            future = _invoice_futures[payment.id] = _invoice_executor.submit(_create_invoice_link, payment, amount)
+    try:
+        return {"url": future.result(timeout=getattr(settings, 'INVOICE_LINK_TIMEOUT', 3))}
+    except FuturesTimeoutError:
+        return {"url": None, "pending": True}
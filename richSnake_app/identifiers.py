@@ -0,0 +1,65 @@
+"""Usernames and referral codes derived from ids that are already unique.
+
+Both are pure functions of a unique key, so they never collide and need no
+existence checks, and `bulk_create_users` can fill them in for thousands of
+rows at once.
+
+- Generated usernames look like `tg-2nkf0x` (base36 of the telegram_id).
+  Telegram handles cannot contain `-`, so they never clash with a real one.
+- Referral codes are 9 characters: the user id run through a bijection of
+  [0, 36**9) so consecutive users do not get consecutive codes. Older,
+  randomly generated codes are 10 characters and so never collide either.
+"""
+import uuid
+
+from django.db import transaction
+
+_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+CODE_LENGTH = 9
+_CODE_SPACE = 36 ** CODE_LENGTH
+# Multiplier coprime with 36, so `(n * _MULTIPLIER + _OFFSET) % _CODE_SPACE` is a bijection
+_MULTIPLIER = 0x5DEECE66D
+_OFFSET = 0x2545F4914F
+
+
+def base36(n, width=0):
+    digits = []
+    while n:
+        n, digit = divmod(n, 36)
+        digits.append(_ALPHABET[digit])
+    return ''.join(reversed(digits)).rjust(width, '0') or '0'
+
+
+def username_for(telegram_id):
+    """Generated username for a user without a Telegram handle."""
+    telegram_id = str(telegram_id or '')
+    if telegram_id.isdigit():
+        return f"tg-{base36(int(telegram_id)).lower()}"
+    return f"u-{uuid.uuid4().hex[:16]}"
+
+
+def referral_code_for(user_id):
+    """Referral code of the user with primary key `user_id`."""
+    if not 0 < user_id < _CODE_SPACE:
+        raise ValueError(f"user id {user_id} out of range for referral codes")
+    return base36((user_id * _MULTIPLIER + _OFFSET) % _CODE_SPACE, CODE_LENGTH)
+
+
+def bulk_create_users(users, batch_size=1000):
+    """Insert unsaved User instances and their Referral rows with two bulk queries per batch.
+
+    Usernames are filled in from telegram_id where missing. Needs a database
+    that returns primary keys from bulk inserts (PostgreSQL, SQLite 3.35+).
+    """
+    from richSnake_app.models import Referral, User
+
+    for user in users:
+        if not user.username:
+            user.username = username_for(user.telegram_id)
+    with transaction.atomic():
+        created = User.objects.bulk_create(users, batch_size=batch_size)
+        Referral.objects.bulk_create(
+            [Referral(user=user, referral_code=referral_code_for(user.pk)) for user in created],
+            batch_size=batch_size,
+        )
+    return created
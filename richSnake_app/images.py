@@ -0,0 +1,71 @@
+"""Small and medium WebP variants of uploaded and downloaded images.
+
+A derivative of `prizes/cup.png` lives at `derivatives/prizes/cup_small.webp`;
+names are derived from the source, so lookups need no extra bookkeeping.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Longest side in pixels
+SIZES = {
+    'small': 64,
+    'medium': 256,
+}
+WEBP_QUALITY = 80
+
+
+def derivative_name(name, size):
+    root, _ = os.path.splitext(name)
+    return f"derivatives/{root}_{size}.webp"
+
+
+def requested_size(request):
+    """Derivative size asked for with `?image_size=`, or None for the original."""
+    size = request.query_params.get('image_size')
+    return size if size in SIZES else None
+
+
+def generate_derivatives(name, storage=default_storage):
+    """Create any missing derivatives of the stored image `name`. Returns names created."""
+    missing = {size: derivative_name(name, size) for size in SIZES}
+    missing = {size: target for size, target in missing.items() if not storage.exists(target)}
+    if not missing:
+        return []
+
+    try:
+        with storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        print(f"[derivatives skipped]: {name} - {e}")
+        return []
+    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    created = []
+    for size, target in missing.items():
+        variant = image.copy()
+        variant.thumbnail((SIZES[size], SIZES[size]), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+        saved = storage.save(target, ContentFile(buffer.getvalue()))
+        if saved != target:
+            # Another worker created it first
+            storage.delete(saved)
+        created.append(target)
+    return created
+
+
+def image_url(field_file, size=None):
+    """URL of the `size` derivative of `field_file`, falling back to the original."""
+    if not field_file:
+        return None
+    if size:
+        target = derivative_name(field_file.name, size)
+        if field_file.storage.exists(target):
+            return field_file.storage.url(target)
+    return field_file.url
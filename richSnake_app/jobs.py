@@ -0,0 +1,117 @@
+"""Database-backed background job queue.
+
+Jobs are rows in the Job table, so no broker is needed. `enqueue` skips a
+job whose kind and key are already queued, and `run_pending` claims due jobs,
+runs their handler, deletes them on success and reschedules them with
+exponential backoff on failure.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from richSnake_app.models import Job
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30  # seconds; doubled on every failed attempt
+BACKOFF_MAX = 3600
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register the decorated function as the handler for `kind` jobs."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, key, payload=None, delay=0):
+    """Queue a job unless one with the same kind and key is already pending.
+
+    Returns True if a new job was created.
+    """
+    try:
+        with transaction.atomic():
+            Job.objects.create(
+                kind=kind,
+                key=str(key),
+                payload=payload or {},
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    ids = list(Job.objects
+               .filter(status=Job.Status.PENDING, run_after__lte=now)
+               .order_by('run_after')
+               .values_list('id', flat=True)[:batch_size])
+    claimed = []
+    for job_id in ids:
+        # Conditional update so concurrent workers never run the same job twice
+        if Job.objects.filter(id=job_id, status=Job.Status.PENDING).update(status=Job.Status.RUNNING, updated_at=now):
+            claimed.append(job_id)
+    return Job.objects.filter(id__in=claimed).order_by('run_after')
+
+
+def run_job(job):
+    """Run one claimed job. Returns True on success."""
+    try:
+        _handlers[job.kind](job.key, **job.payload)
+    except Exception as e:
+        job.attempts += 1
+        job.last_error = f"{e!r}\n{traceback.format_exc()}"
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = Job.Status.FAILED
+        else:
+            job.status = Job.Status.PENDING
+            delay = min(BACKOFF_BASE * 2 ** (job.attempts - 1), BACKOFF_MAX)
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        try:
+            job.save(update_fields=['attempts', 'last_error', 'status', 'run_after', 'updated_at'])
+        except IntegrityError:
+            # A fresh job for the same key was queued meanwhile; it supersedes this one
+            job.delete()
+        print(f"[job failed]: {job} - {e}")
+        return False
+    job.delete()
+    return True
+
+
+def run_pending(batch_size=50):
+    """Run up to `batch_size` due jobs. Returns (succeeded, failed)."""
+    succeeded = failed = 0
+    for job in _claim(batch_size):
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def requeue_stuck(older_than=600):
+    """Return jobs left RUNNING by a crashed worker to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stuck = Job.objects.filter(status=Job.Status.RUNNING, updated_at__lt=cutoff)
+    requeued = 0
+    for job in stuck:
+        try:
+            with transaction.atomic():
+                requeued += Job.objects.filter(id=job.id, status=Job.Status.RUNNING).update(
+                    status=Job.Status.PENDING)
+        except IntegrityError:
+            job.delete()
+    return requeued
+
+
+@handler(Job.Kind.REFRESH_AVATAR)
+def _refresh_avatar(telegram_id):
+    from richSnake_app.helpers import refresh_user_avatar
+
+    refresh_user_avatar(telegram_id)
@@ -0,0 +1,164 @@
+import base64
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from richSnake_app import leaderboard_engine, score_buffer
+from richSnake_app.authentication import invalidate_user
+from richSnake_app.models import User
+
+# Fields a leaderboard can be ranked by. Ties are broken by ascending id so the
+# order is deterministic and matches the (field DESC, id ASC) rank indexes.
+RANK_FIELDS = ('score', 'balance')
+
+
+def _check_field(field):
+    if field not in RANK_FIELDS:
+        raise ValueError(f"Unsupported leaderboard field: {field}")
+
+
+def top_users(field='score', limit=100):
+    """Top `limit` non-superusers ordered by `field`, highest first."""
+    _check_field(field)
+    if leaderboard_engine.is_enabled():
+        leaderboard_engine.engine.ensure_fresh()
+        ids = leaderboard_engine.engine.top_ids(field, limit)
+        users = User.objects.in_bulk(ids)
+        return [users[user_id] for user_id in ids if user_id in users]
+    return User.objects.exclude(is_superuser=True).order_by(f'-{field}', 'id')[:limit]
+
+
+def get_user_rank(user, field='score'):
+    """1-based rank of `user` among all users ordered by `field` desc, id asc.
+
+    Counts the users ahead of `user` instead of materializing the ranking:
+    everyone with a higher value, plus everyone with the same value and a
+    lower id. Both parts are range scans on the (field, id) index.
+
+    The in-memory engine only knows flushed scores, so a user with buffered
+    score is ranked by the query, using the merged value on `user`.
+    """
+    _check_field(field)
+    if leaderboard_engine.is_enabled() and not (field == 'score' and score_buffer.has_pending(user.id)):
+        leaderboard_engine.engine.ensure_fresh()
+        rank = leaderboard_engine.engine.rank(user.id, field)
+        if rank is not None:
+            return rank
+    value = getattr(user, field)
+    ahead = (User.objects
+             .filter(**{f'{field}__gte': value})
+             .exclude(**{field: value, 'id__gte': user.id})
+             .count())
+    return ahead + 1
+
+
+def _version_key(field):
+    return f'leaderboard:{field}:version'
+
+
+def _snapshot_key(field, image_size=None):
+    return f'leaderboard:{field}:snapshot:{image_size or "original"}'
+
+
+def get_version(field):
+    """Current version token of `field`; a lost key gets a new token, never an old one."""
+    return cache.get_or_set(_version_key(field), lambda: uuid.uuid4().hex, timeout=None)
+
+
+def bump_version(field):
+    """Mark cached top-100 snapshots for `field` as out of date."""
+    cache.set(_version_key(field), uuid.uuid4().hex, timeout=None)
+
+
+def record_change(*users):
+    """Call after saving a change to the users' score or balance."""
+    for user in users:
+        leaderboard_engine.sync_user(user)
+        # Writes through update() skip post_save, so drop cached auth users here
+        invalidate_user(user.pk)
+    for field in RANK_FIELDS:
+        bump_version(field)
+
+
+def top_users_json(field='score', image_size=None):
+    """Rendered JSON bytes of the top-100 list for `field`.
+
+    The bytes are shared by every worker through the cache. A snapshot is
+    reused while its version matches the current one, and for up to
+    `LEADERBOARD_SNAPSHOT_STALENESS` seconds after a newer write so that a
+    busy leaderboard is not re-rendered on every score update.
+    """
+    from richSnake_app.serializers import UserSerializer
+
+    _check_field(field)
+    version = get_version(field)
+    snapshot = cache.get(_snapshot_key(field, image_size))
+    if snapshot is not None:
+        built_version, built_at, payload = snapshot
+        staleness = getattr(settings, 'LEADERBOARD_SNAPSHOT_STALENESS', 30)
+        if built_version == version or time.time() - built_at < staleness:
+            return payload
+
+    serializer = UserSerializer(top_users(field), many=True, context={'image_size': image_size})
+    payload = JSONRenderer().render(serializer.data)
+    cache.set(_snapshot_key(field, image_size), (version, time.time(), payload), timeout=None)
+    return payload
+
+
+def render_leaderboard(user, field='score', image_size=None):
+    """JSON body for the leaderboard endpoints: cached top-100 plus `user`'s own entry."""
+    from richSnake_app.serializers import UserSerializer
+
+    renderer = JSONRenderer()
+    return b''.join([
+        b'{"leaderBoard":', top_users_json(field, image_size),
+        b',"user_rank":', renderer.render(get_user_rank(user, field)),
+        b',"user":', renderer.render(UserSerializer(user, context={'image_size': image_size}).data),
+        b'}',
+    ])
+
+
+def encode_cursor(user, field='score'):
+    raw = json.dumps([getattr(user, field), user.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """(value, id) from a cursor string; ValueError if it is malformed."""
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(value, (int, float)) or not isinstance(user_id, int):
+        raise ValueError("Invalid cursor")
+    return value, user_id
+
+
+def users_after(field='score', cursor=None, limit=50):
+    """Next `limit` users in ranking order after `cursor` (from the top if None).
+
+    Keyset pagination on (field, id): the cursor is the last row seen, so
+    every page is one range scan on the rank index however deep it is.
+    """
+    _check_field(field)
+    users = User.objects.order_by(f'-{field}', 'id')
+    if cursor is not None:
+        value, user_id = decode_cursor(cursor)
+        users = users.filter(**{f'{field}__lte': value}).exclude(**{field: value, 'id__lte': user_id})
+    return list(users[:limit])
+
+
+def users_before(user, field='score', limit=10):
+    """Up to `limit` users ranked directly above `user`, in ranking order."""
+    _check_field(field)
+    value = getattr(user, field)
+    users = (User.objects
+             .filter(**{f'{field}__gte': value})
+             .exclude(**{field: value, 'id__gte': user.id})
+             .order_by(field, '-id')[:limit])
+    return list(users)[::-1]
+
@@ -0,0 +1,351 @@
+"""In-process order-statistic index over users' score and balance.
+
+Each worker keeps its own copy, built from the User table on first use and
+updated in place by the views that change score or balance. From then on a
+background thread in that worker checks the copy against the database every
+`LEADERBOARD_REBUILD_INTERVAL` seconds and rebuilds it, so writes made by
+other processes are eventually picked up.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from richSnake_app.models import User
+
+
+class SortedRankList:
+    """Bucketed sorted list with O(log n) insert, remove and rank lookups.
+
+    Items live in sorted buckets of at most `2 * load` entries. A Fenwick
+    tree over bucket lengths gives the number of items before any bucket,
+    so positional lookups never walk the whole list.
+    """
+
+    def __init__(self, items=(), load=500):
+        self._load = load
+        items = sorted(items)
+        self._buckets = [items[i:i + load] for i in range(0, len(items), load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(items)
+        self._build_tree()
+
+    def __len__(self):
+        return self._len
+
+    def _build_tree(self):
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos, delta):
+        pos += 1
+        while pos < len(self._tree):
+            self._tree[pos] += delta
+            pos += pos & -pos
+
+    def _tree_prefix(self, pos):
+        """Number of items in buckets before `pos`."""
+        total = 0
+        while pos > 0:
+            total += self._tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def _tree_find(self, index):
+        """Bucket holding the item at `index` and the offset inside it."""
+        pos = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] <= index:
+                pos = nxt
+                index -= self._tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def add(self, item):
+        if not self._buckets:
+            self._buckets.append([item])
+            self._maxes.append(item)
+            self._len = 1
+            self._build_tree()
+            return
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._buckets[pos].append(item)
+            self._maxes[pos] = item
+        else:
+            insort(self._buckets[pos], item)
+        self._len += 1
+        if len(self._buckets[pos]) > 2 * self._load:
+            bucket = self._buckets[pos]
+            self._buckets[pos:pos + 1] = [bucket[:self._load], bucket[self._load:]]
+            self._maxes[pos:pos + 1] = [bucket[self._load - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, item):
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            raise ValueError(f"{item!r} not in list")
+        bucket = self._buckets[pos]
+        idx = bisect_left(bucket, item)
+        if idx == len(bucket) or bucket[idx] != item:
+            raise ValueError(f"{item!r} not in list")
+        del bucket[idx]
+        self._len -= 1
+        if not bucket:
+            del self._buckets[pos]
+            del self._maxes[pos]
+            self._build_tree()
+        else:
+            self._maxes[pos] = bucket[-1]
+            self._tree_add(pos, -1)
+
+    def index(self, item):
+        """0-based position of `item`."""
+        pos = bisect_left(self._maxes, item)
+        if pos < len(self._maxes):
+            bucket = self._buckets[pos]
+            idx = bisect_left(bucket, item)
+            if idx < len(bucket) and bucket[idx] == item:
+                return self._tree_prefix(pos) + idx
+        raise ValueError(f"{item!r} not in list")
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("list index out of range")
+        pos, idx = self._tree_find(index)
+        return self._buckets[pos][idx]
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def islice(self, start=0, stop=None):
+        """Iterate items from position `start` up to `stop`."""
+        stop = self._len if stop is None else min(stop, self._len)
+        if start >= stop:
+            return
+        pos, idx = self._tree_find(start)
+        remaining = stop - start
+        while remaining and pos < len(self._buckets):
+            chunk = self._buckets[pos][idx:idx + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            pos, idx = pos + 1, 0
+
+
+class LeaderboardEngine:
+    """Score and balance rankings keyed on (-value, id).
+
+    Ranks follow the same ordering as `leaderboard.get_user_rank`: highest
+    value first, ties broken by ascending id.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # at most one build in flight
+        self._built_at = None
+        self._updates_during_build = None
+        self._reset()
+
+    def _reset(self):
+        self._values = {}
+        self._superusers = set()
+        self._lists = {field: SortedRankList() for field in ('score', 'balance')}
+
+    def build(self, rows=None):
+        """(Re)load every user. `rows` is an iterable of (id, score, balance, is_superuser)."""
+        if rows is None:
+            rows = User.objects.values_list('id', 'score', 'balance', 'is_superuser').iterator()
+        with self._lock:
+            # Updates made while the rows are read are replayed onto the new copy
+            self._updates_during_build = []
+        values, superusers = {}, set()
+        for user_id, score, balance, is_superuser in rows:
+            values[user_id] = {'score': score, 'balance': balance}
+            if is_superuser:
+                superusers.add(user_id)
+        lists = {
+            field: SortedRankList((-v[field], user_id) for user_id, v in values.items())
+            for field in ('score', 'balance')
+        }
+        with self._lock:
+            replay, self._updates_during_build = self._updates_during_build, None
+            self._values, self._superusers, self._lists = values, superusers, lists
+            for args in replay:
+                self.update(*args)
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        """Build on first use (other threads wait for it); rebuild in the background when stale."""
+        start_maintenance()
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+            return
+        if time.monotonic() - self._built_at > getattr(settings, 'LEADERBOARD_REBUILD_INTERVAL', 600):
+            self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        """Start a rebuild thread unless a build is already running."""
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"[leaderboard rebuild failed]: {e}")
+            finally:
+                self._build_lock.release()
+                close_old_connections()
+
+        threading.Thread(target=run, name='leaderboard-rebuild', daemon=True).start()
+
+    def update(self, user_id, score=None, balance=None, is_superuser=False):
+        with self._lock:
+            if self._updates_during_build is not None:
+                self._updates_during_build.append((user_id, score, balance, is_superuser))
+            current = self._values.setdefault(user_id, {})
+            for field, value in (('score', score), ('balance', balance)):
+                if value is None:
+                    continue
+                if field in current:
+                    self._lists[field].remove((-current[field], user_id))
+                current[field] = value
+                self._lists[field].add((-value, user_id))
+            if is_superuser:
+                self._superusers.add(user_id)
+            else:
+                self._superusers.discard(user_id)
+
+    def discard(self, user_id):
+        with self._lock:
+            current = self._values.pop(user_id, None)
+            if current:
+                for field, value in current.items():
+                    self._lists[field].remove((-value, user_id))
+            self._superusers.discard(user_id)
+
+    def rank(self, user_id, field='score'):
+        """1-based rank, or None if the user is unknown to the engine."""
+        with self._lock:
+            current = self._values.get(user_id)
+            if current is None or field not in current:
+                return None
+            return self._lists[field].index((-current[field], user_id)) + 1
+
+    def top_ids(self, field='score', limit=100):
+        """Ids of the top `limit` non-superusers by `field`."""
+        ids = []
+        with self._lock:
+            for _, user_id in self._lists[field]:
+                if user_id in self._superusers:
+                    continue
+                ids.append(user_id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    def __len__(self):
+        return len(self._values)
+
+    def check(self):
+        """Compare this worker's copy against the database; return a list of mismatch descriptions.
+
+        Writes landing while the check runs can show up as transient mismatches.
+        """
+        from richSnake_app.leaderboard import RANK_FIELDS
+
+        with self._lock:
+            values = {user_id: dict(current) for user_id, current in self._values.items()}
+            orders = {field: [user_id for _, user_id in self._lists[field]] for field in RANK_FIELDS}
+
+        problems = []
+        seen = set()
+        for user_id, score, balance in User.objects.values_list('id', 'score', 'balance').iterator():
+            seen.add(user_id)
+            current = values.get(user_id)
+            if current is None:
+                problems.append(f"user {user_id} missing")
+            elif current.get('score') != score or current.get('balance') != balance:
+                problems.append(
+                    f"user {user_id}: engine ({current.get('score')}, {current.get('balance')})"
+                    f" != db ({score}, {balance})")
+        for user_id in values.keys() - seen:
+            problems.append(f"user {user_id} not in database")
+        for field in RANK_FIELDS:
+            expected = list(User.objects.order_by(f'-{field}', 'id').values_list('id', flat=True).iterator())
+            if expected != orders[field]:
+                problems.append(f"{field} ordering differs from database")
+        return problems
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'users': len(self),
+            'built_seconds_ago': None if self._built_at is None else time.monotonic() - self._built_at,
+        }
+
+
+engine = LeaderboardEngine()
+
+
+def is_enabled():
+    return getattr(settings, 'LEADERBOARD_IN_MEMORY', False)
+
+
+def sync_user(user):
+    """Push `user`'s current score and balance into the engine, if enabled."""
+    if is_enabled() and engine._built_at is not None:
+        engine.update(user.id, score=user.score, balance=user.balance, is_superuser=user.is_superuser)
+
+
+_maintenance = None
+
+
+def _maintain():
+    """Build the engine, then check and rebuild it every LEADERBOARD_REBUILD_INTERVAL seconds."""
+    while True:
+        try:
+            engine.ensure_fresh()
+            time.sleep(getattr(settings, 'LEADERBOARD_REBUILD_INTERVAL', 600))
+            problems = engine.check()
+            if problems:
+                print(f"[leaderboard check]: {len(problems)} mismatches in worker {os.getpid()}, "
+                      f"e.g. {problems[0]}; rebuilding")
+            with engine._build_lock:
+                engine.build()
+        except Exception as e:
+            print(f"[leaderboard maintenance failed]: {e}")
+            time.sleep(60)
+        finally:
+            close_old_connections()
+
+
+def start_maintenance():
+    """Start this worker's build/check thread. Safe to call repeatedly.
+
+    Called on every use rather than from AppConfig.ready, so only processes
+    that serve leaderboards run the thread, not migrate or the job and bot
+    update commands.
+    """
+    global _maintenance
+    if (_maintenance is None or not _maintenance.is_alive()) and is_enabled():
+        _maintenance = threading.Thread(target=_maintain, name='leaderboard-maintenance', daemon=True)
+        _maintenance.start()
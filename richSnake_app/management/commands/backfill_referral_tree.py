@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from richSnake_app.referral_tree import max_depth, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the referral closure table (ReferralPath) from ReferredUser rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            written = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"Wrote {written} referral paths (max depth {max_depth()}) "
+                          f"in {time.monotonic() - started:.2f}s")
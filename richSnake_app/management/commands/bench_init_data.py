@@ -0,0 +1,59 @@
+import hashlib
+import hmac
+import json
+import time
+import timeit
+import urllib.parse
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.helpers import InitDataVerifier, validate_init_data
+
+
+def make_init_data(bot_token, user_id=123456789, username='bench', **extra):
+    """Build a correctly signed initData string for `bot_token`."""
+    fields = {
+        **extra,
+        'query_id': 'AAHdF6IQAAAAAN0XohDhrOrc',
+        'user': json.dumps({'id': user_id, 'first_name': 'Bench', 'username': username, 'language_code': 'en'}),
+        'auth_date': str(int(time.time())),
+    }
+    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return '&'.join(f"{k}={quote(v, safe='')}" for k, v in fields.items())
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark initData verification: legacy helper vs InitDataVerifier (cold and cached)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        bot_token = '123456:bench-token'
+        init_data = make_init_data(bot_token)
+
+        def legacy():
+            parsed = dict(urllib.parse.parse_qsl(init_data))
+            assert validate_init_data(init_data, bot_token)
+            json.loads(parsed['user'])
+
+        def cold():
+            verifier = InitDataVerifier(bot_token)
+            verifier.verify(init_data)
+
+        uncached = InitDataVerifier(bot_token, cache_size=0)
+        cached = InitDataVerifier(bot_token)
+
+        cases = [
+            ('legacy parse_qsl + validate_init_data', legacy),
+            ('verifier, new instance per call', cold),
+            ('verifier, shared secret, no cache', lambda: uncached.verify(init_data)),
+            ('verifier, cached initData', lambda: cached.verify(init_data)),
+        ]
+        for name, func in cases:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write(f"{name:<40} {seconds / number * 1e6:8.2f} us/call")
@@ -0,0 +1,40 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from richSnake_app.telegram import TelegramClient
+from richSnake_app.telegram_stub import StubBotAPI
+
+
+class Command(BaseCommand):
+    help = "Benchmark one-off requests.get calls against the pooled TelegramClient, using the local stub API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=500)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        token = '123456:bench-token'
+        with StubBotAPI() as stub:
+            url = f"{stub.url}/bot{token}/getUserProfilePhotos"
+
+            def unpooled():
+                requests.get(url, params={'user_id': 1, 'limit': 1}).json()
+
+            client = TelegramClient(token, base_url=stub.url)
+
+            def pooled():
+                client.get_user_profile_photos(1)
+
+            for name, func in (('requests.get per call', unpooled), ('pooled TelegramClient', pooled)):
+                func()  # warm up
+                started = time.perf_counter()
+                for _ in range(number):
+                    func()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:<25} {elapsed / number * 1e3:8.3f} ms/call")
+
+            for method, stats in client.metrics.snapshot().items():
+                self.stdout.write(f"{method}: {stats['calls']} calls, {stats['errors']} errors, "
+                                  f"avg {stats['avg_seconds'] * 1e3:.3f} ms, max {stats['max_seconds'] * 1e3:.3f} ms")
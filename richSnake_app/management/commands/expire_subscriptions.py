@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.subscriptions import deactivate_expired
+
+
+class Command(BaseCommand):
+    help = "Deactivate subscriptions past their expire_time in batches. Run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows per UPDATE (default: 1000).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deactivated = deactivate_expired(batch_size=options['batch_size'])
+        self.stdout.write(f"Deactivated {deactivated} expired subscriptions in {time.monotonic() - started:.2f}s")
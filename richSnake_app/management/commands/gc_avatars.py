@@ -0,0 +1,26 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from richSnake_app.images import SIZES, derivative_name
+from richSnake_app.media import orphaned_files
+from richSnake_app.models import User
+
+
+class Command(BaseCommand):
+    help = "Delete avatar files and avatar derivatives that no user references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only list the orphaned files.")
+
+    def handle(self, *args, **options):
+        referenced = set(User.objects.exclude(avatar='').exclude(avatar=None)
+                         .values_list('avatar', flat=True).iterator())
+        derivatives = {derivative_name(name, size) for name in referenced for size in SIZES}
+        orphans = orphaned_files('avatars', referenced) + orphaned_files('derivatives/avatars', derivatives)
+        for name in orphans:
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        action = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(f"{action} {len(orphans)} orphaned avatar files ({len(referenced)} referenced)")
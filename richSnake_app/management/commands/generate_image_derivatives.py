@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from richSnake_app.images import generate_derivatives
+from richSnake_app.models import Prize, Task, User
+
+
+class Command(BaseCommand):
+    help = "Create missing WebP derivatives for existing avatars, prize and task images."
+
+    def handle(self, *args, **options):
+        sources = [
+            (User, 'avatar'),
+            (Prize, 'image'),
+            (Task, 'source_image'),
+        ]
+        created = 0
+        for model, field in sources:
+            names = (model.objects.exclude(**{field: ''}).exclude(**{field: None})
+                     .values_list(field, flat=True).distinct().iterator())
+            for name in names:
+                created += len(generate_derivatives(name))
+        self.stdout.write(f"Created {created} derivatives")
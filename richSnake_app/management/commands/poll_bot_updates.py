@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.bot_updates import Poller, requeue_stuck
+
+
+class Command(BaseCommand):
+    help = "Receive Bot API updates by long-polling getUpdates instead of the webhook (staging, behind NAT)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Poll one batch and exit.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Updates per getUpdates call (max 100).")
+        parser.add_argument('--timeout', type=int, default=25, help="Long-poll timeout in seconds (default: 25).")
+        parser.add_argument('--stats-interval', type=float, default=60,
+                            help="Seconds between counter reports (default: 60).")
+        parser.add_argument('--delete-webhook', action='store_true',
+                            help="Remove the bot's webhook first; getUpdates is refused while one is set.")
+
+    def handle(self, *args, **options):
+        poller = Poller(batch_size=options['batch_size'], timeout=options['timeout'])
+        if options['delete_webhook']:
+            poller.client.delete_webhook()
+        requeued = requeue_stuck()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stuck updates")
+
+        last_report = time.monotonic()
+        try:
+            while True:
+                poller.poll_once()
+                if options['once']:
+                    break
+                if time.monotonic() - last_report >= options['stats_interval']:
+                    self._report(poller)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        self._report(poller)
+
+    def _report(self, poller):
+        counters = poller.counters()
+        lag = counters['last_lag_seconds']
+        self.stdout.write(
+            f"Polls: {counters['polls']} ({counters['empty_polls']} empty, {counters['poll_errors']} errors), "
+            f"updates: {counters['received']} received, {counters['handled']} handled, {counters['failed']} failed, "
+            f"{counters['updates_per_second']:.2f}/s, lag: last {'-' if lag is None else f'{lag:.2f}s'}, "
+            f"max {counters['max_lag_seconds']:.2f}s, offset {counters['offset']}"
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.bot_updates import process_pending, requeue_stuck
+
+
+class Command(BaseCommand):
+    help = "Handle Bot API updates stored by payment_status_webhook (pre-checkout answers, payments)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process one batch and exit.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=0.5,
+                            help="Seconds to wait when the inbox is empty (default: 0.5).")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stuck()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stuck updates")
+
+        while True:
+            done, failed = process_pending(options['batch_size'])
+            if done or failed:
+                self.stdout.write(f"Updates: {done} done, {failed} failed")
+            if options['once']:
+                return
+            if not done and not failed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.score_events import prune, prune_cutoff
+
+
+class Command(BaseCommand):
+    help = "Delete raw score events older than the retention window, after rolling them up."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=35,
+                            help="Keep raw events for at least this many days (default: 35).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = prune_cutoff(options['retention_days'])
+        deleted = prune(options['retention_days'], options['batch_size'])
+        self.stdout.write(f"Deleted {deleted} events before {cutoff:%Y-%m-%d} in {time.monotonic() - started:.2f}s")
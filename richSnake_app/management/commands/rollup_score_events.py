@@ -0,0 +1,21 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from richSnake_app.score_events import rollup
+
+
+class Command(BaseCommand):
+    help = "Aggregate score events into daily and weekly rollups. Run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1,
+                            help="Also recompute periods covering this many past days (default: 1).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        since = timezone.localdate() - timedelta(days=options['days'])
+        written = rollup(since)
+        self.stdout.write(f"Wrote {written} rollups since {since} in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from richSnake_app.jobs import requeue_stuck, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (avatar refreshes, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process one batch and exit.")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty (default: 1).")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stuck()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stuck jobs")
+
+        while True:
+            succeeded, failed = run_pending(options['batch_size'])
+            if succeeded or failed:
+                self.stdout.write(f"Jobs: {succeeded} done, {failed} failed")
+            if options['once']:
+                return
+            if not succeeded and not failed:
+                time.sleep(options['sleep'])
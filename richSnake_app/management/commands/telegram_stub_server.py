@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from richSnake_app.telegram_stub import StubBotAPI
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Telegram Bot API server (point TELEGRAM_API_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds of artificial delay per request.")
+
+    def handle(self, *args, **options):
+        stub = StubBotAPI(options['host'], options['port'], latency=options['latency'])
+        self.stdout.write(f"Fake Bot API listening on {stub.url}")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
@@ -0,0 +1,42 @@
+"""Content-addressed storage for downloaded images.
+
+Files are stored under their SHA-256, so identical images share one file and
+saving the same bytes twice is a no-op.
+"""
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+def content_name(content, directory, extension):
+    digest = hashlib.sha256(content).hexdigest()
+    return f"{directory}/{digest[:2]}/{digest}.{extension}"
+
+
+def save_content_addressed(content, directory, extension='jpg', storage=default_storage):
+    """Store `content` bytes once and return its storage name."""
+    name = content_name(content, directory, extension)
+    if not storage.exists(name):
+        saved = storage.save(name, ContentFile(content))
+        if saved != name:
+            # Lost a race with another writer of the same bytes; keep theirs
+            storage.delete(saved)
+    return name
+
+
+def walk_files(directory, storage=default_storage):
+    """Every file name under `directory`, recursively."""
+    if not storage.exists(directory):
+        return
+    dirs, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for sub in dirs:
+        yield from walk_files(os.path.join(directory, sub), storage)
+
+
+def orphaned_files(directory, referenced, storage=default_storage):
+    """Files under `directory` whose names are not in `referenced`."""
+    return [name for name in walk_files(directory, storage) if name not in referenced]
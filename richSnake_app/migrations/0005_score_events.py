@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0004_payment_withdrawrequest_subscription_active_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('source', models.PositiveSmallIntegerField(choices=[(1, 'Game'), (2, 'Game (hard set)'), (3, 'Task'), (4, 'Referral')])),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ScoreEvents',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScoreRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('score', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ScoreRollups',
+                'indexes': [models.Index(fields=['period', 'period_start', '-score', 'user'], name='score_rollup_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'user'), name='unique_score_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0006_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_file_unique_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
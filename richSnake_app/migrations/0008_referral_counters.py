@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Referral = apps.get_model('richSnake_app', 'Referral')
+    ReferredUser = apps.get_model('richSnake_app', 'ReferredUser')
+    totals = ReferredUser.objects.filter(referred_by=OuterRef('pk')).values('referred_by')
+    Referral.objects.update(
+        referred_count=Coalesce(Subquery(totals.annotate(n=Count('id')).values('n')), 0),
+        earned_score_total=Coalesce(Subquery(totals.annotate(s=Sum('earned_score')).values('s')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0007_user_avatar_file_unique_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referral',
+            name='earned_score_total',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='referred_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='referreduser',
+            index=models.Index(fields=['referred_by', '-id'], name='referred_user_page_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
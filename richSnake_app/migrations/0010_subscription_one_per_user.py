@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_subscriptions(apps, schema_editor):
+    # Keep each user's active, latest-expiring row
+    Subscription = apps.get_model('richSnake_app', 'Subscription')
+    keep = {}
+    for sub_id, user_id in (Subscription.objects.order_by('user_id', '-active', '-expire_time', '-id')
+                            .values_list('id', 'user_id').iterator()):
+        keep.setdefault(user_id, sub_id)
+    Subscription.objects.exclude(id__in=list(keep.values())).delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0009_referral_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='subscription',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='subscription', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'active', 'expire_time'], name='subscription_status_idx'),
+        ),
+    ]
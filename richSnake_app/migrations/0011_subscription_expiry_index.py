@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0010_subscription_one_per_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('active', True)), fields=['expire_time'], name='subscription_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0012_bot_update_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='invoice_link',
+            field=models.URLField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'status', 'amount'], name='payment_pending_idx'),
+        ),
+    ]
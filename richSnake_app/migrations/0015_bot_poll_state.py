@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('richSnake_app', '0014_bot_update_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotPollState',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('offset', models.BigIntegerField()),
+                ('last_update_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'BotPollStates',
+            },
+        ),
+    ]
@@ -1,9 +1,9 @@
-import random
-import string
-
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from richSnake_app.identifiers import referral_code_for, username_for
+
 
 # Create your models here.
 class Task(models.Model):
@@ -32,6 +32,8 @@ class User(AbstractUser):
     telegram_id = models.CharField(max_length=100, unique=True)
     first_name = models.CharField(max_length=100)
     avatar = models.ImageField(upload_to='avatars/', null=True)
+    # Telegram's stable id for the photo stored in `avatar`, to skip re-downloads
+    avatar_file_unique_id = models.CharField(max_length=64, blank=True, default='')
     score = models.IntegerField(default=0)
     balance = models.IntegerField(default=0)
     record = models.IntegerField(default=0)
@@ -40,23 +42,17 @@ class User(AbstractUser):
 
     class Meta:
         verbose_name_plural = 'User'
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='user_score_rank_idx'),
+            models.Index(fields=['-balance', 'id'], name='user_balance_rank_idx'),
+        ]
 
     def __str__(self):
         return self.username
 
-    def generate_unique_username(self):
-        while True:
-            random_string = ''.join(random.choices(string.ascii_lowercase, k=7))
-            random_number = ''.join(random.choices(string.digits, k=3))
-            username = f"{random_string}{random_number}"
-
-            # Check if this username already exists
-            if not User.objects.filter(username=username).exists():
-                return username
-
     def save(self, *args, **kwargs):
         if not self.username:
-            self.username = self.generate_unique_username()
+            self.username = username_for(self.telegram_id)
         super().save(*args, **kwargs)
 
 
@@ -90,6 +86,9 @@ class UserTask(models.Model):
 class Referral(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='referral')
     referral_code = models.CharField(max_length=10, unique=True)
+    # Denormalized totals over referred_users, kept in step by auth_view
+    referred_count = models.PositiveIntegerField(default=0)
+    earned_score_total = models.BigIntegerField(default=0)
 
     class Meta:
         verbose_name_plural = 'Referral'
@@ -97,7 +96,7 @@ class Referral(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.referral_code:
-            self.referral_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+            self.referral_code = referral_code_for(self.user_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -111,16 +110,27 @@ class ReferredUser(models.Model):
 
     class Meta:
         verbose_name_plural = 'ReferredUsers'
+        indexes = [
+            models.Index(fields=['referred_by', '-id'], name='referred_user_page_idx'),
+        ]
 
     def __str__(self):
         return f"{self.referred_user.username} reffered by {self.referred_by.user.username}"
 
 
 class Subscription(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # One row per user, extended in place on every purchase
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='subscription')
     expire_time = models.DateTimeField()
     active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'active', 'expire_time'], name='subscription_status_idx'),
+            # Sweep of expired rows by the expire_subscriptions command
+            models.Index(fields=['expire_time'], condition=models.Q(active=True), name='subscription_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s Subscription"
 
@@ -161,6 +171,8 @@ class Payment(models.Model):
     order_id = models.CharField(max_length=100, null=True, blank=True)
     payment_method = models.CharField(max_length=20, choices=PaymentMethod.choices, default=PaymentMethod.TELEGRAM)
     status = models.CharField(max_length=20, choices=PaymentStatus.choices, default=PaymentStatus.PENDING)
+    # Telegram invoice link for this payment, reused while it is pending
+    invoice_link = models.URLField(max_length=255, blank=True, default='')
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -171,9 +183,156 @@ class Payment(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'created_at']),
-            models.Index(fields=['payment_method', 'status'])
+            models.Index(fields=['payment_method', 'status']),
+            models.Index(fields=['user', 'status', 'amount'], name='payment_pending_idx'),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} ({self.payment_method}, {self.status})"
 
+
+class ScoreEvent(models.Model):
+    """Append-only log of score changes; aggregated into ScoreRollup."""
+
+    class Source(models.IntegerChoices):
+        GAME = 1, "Game"
+        GAME_HARD = 2, "Game (hard set)"
+        TASK = 3, "Task"
+        REFERRAL = 4, "Referral"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_events')
+    delta = models.IntegerField()
+    source = models.PositiveSmallIntegerField(choices=Source.choices)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'ScoreEvents'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.delta:+} ({self.get_source_display()})"
+
+
+class ScoreRollup(models.Model):
+    class Period(models.TextChoices):
+        DAY = "day", "Day"
+        WEEK = "week", "Week"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_rollups')
+    period = models.CharField(max_length=4, choices=Period.choices)
+    period_start = models.DateField()
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'ScoreRollups'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'user'], name='unique_score_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'period_start', '-score', 'user'], name='score_rollup_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.period} {self.period_start}: {self.score}"
+
+
+class Job(models.Model):
+    """A unit of background work, executed by the `run_jobs` command."""
+
+    class Kind(models.TextChoices):
+        REFRESH_AVATAR = "refresh_avatar", "Refresh avatar"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        FAILED = "failed", "Failed"
+
+    kind = models.CharField(max_length=32, choices=Kind.choices)
+    key = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Jobs'
+        constraints = [
+            # At most one queued job per kind and key, e.g. per telegram_id
+            models.UniqueConstraint(fields=['kind', 'key'], condition=models.Q(status='pending'),
+                                    name='unique_pending_job'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} ({self.status})"
+
+
+class ReferralPath(models.Model):
+    """Closure table of the referral tree: `ancestor` invited `descendant`, `depth` levels down.
+
+    Only paths of depth 1 up to REFERRAL_TREE_MAX_DEPTH are stored.
+    """
+    ancestor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='downline_paths')
+    descendant = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upline_paths')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name_plural = 'ReferralPaths'
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_referral_path'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='referral_path_downline_idx'),
+            models.Index(fields=['descendant', 'depth'], name='referral_path_upline_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class BotUpdate(models.Model):
+    """Inbox of raw Bot API updates, processed by the `process_bot_updates` command.
+
+    Keyed by Telegram's update_id, so redelivered updates are stored once.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    update_id = models.BigIntegerField(primary_key=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'BotUpdates'
+        indexes = [
+            models.Index(fields=['status', 'update_id'], name='bot_update_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.update_id} ({self.status})"
+
+
+class BotPollState(models.Model):
+    """Where `poll_bot_updates` left off in getUpdates."""
+    name = models.CharField(max_length=32, primary_key=True)
+    offset = models.BigIntegerField()
+    last_update_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = 'BotPollStates'
+
+    def __str__(self):
+        return f"{self.name}: {self.offset}"
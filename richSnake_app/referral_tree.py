@@ -0,0 +1,82 @@
+"""Multi-level referral tree stored as a closure table (see ReferralPath).
+
+Every user has one row per ancestor up to REFERRAL_TREE_MAX_DEPTH levels
+up, so downline sizes and top referrers are plain indexed aggregates
+instead of recursive walks.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from richSnake_app.models import ReferralPath, ReferredUser, User
+
+
+TOP_REFERRERS_LIMIT = 100
+
+
+def max_depth():
+    return getattr(settings, 'REFERRAL_TREE_MAX_DEPTH', 3)
+
+
+def add_referral(referrer, user):
+    """Record that `referrer` invited the new `user`. Two queries regardless of depth."""
+    limit = max_depth()
+    paths = [ReferralPath(ancestor_id=referrer.pk, descendant_id=user.pk, depth=1)]
+    upline = ReferralPath.objects.filter(descendant=referrer, depth__lt=limit).values_list('ancestor_id', 'depth')
+    paths += [ReferralPath(ancestor_id=ancestor_id, descendant_id=user.pk, depth=depth + 1)
+              for ancestor_id, depth in upline]
+    ReferralPath.objects.bulk_create(paths, ignore_conflicts=True)
+
+
+def downline_by_depth(user):
+    """{depth: number of users} for everyone `user` brought in, directly or not."""
+    counts = (ReferralPath.objects.filter(ancestor=user)
+              .values('depth').annotate(users=Count('id')).order_by('depth'))
+    return {row['depth']: row['users'] for row in counts}
+
+
+def _top_referrer_counts(depth):
+    """[(user id, downline size), ...] for the top TOP_REFERRERS_LIMIT, cached briefly."""
+    key = f"top-referrers:{depth}"
+    rows = cache.get(key)
+    if rows is None:
+        paths = ReferralPath.objects.all()
+        if depth < max_depth():
+            paths = paths.filter(depth__lte=depth)
+        rows = list(paths.values_list('ancestor').annotate(downline=Count('id'))
+                    .order_by('-downline', 'ancestor')[:TOP_REFERRERS_LIMIT])
+        cache.set(key, rows, timeout=getattr(settings, 'TOP_REFERRERS_CACHE_TTL', 60))
+    return rows
+
+
+def top_referrers(limit=100, depth=None):
+    """[(user, downline size), ...] biggest downline first, counting levels up to `depth`.
+
+    The ranking is a GROUP BY over the whole closure table, so it is shared
+    through the cache for TOP_REFERRERS_CACHE_TTL seconds.
+    """
+    depth = min(depth or max_depth(), max_depth())
+    rows = _top_referrer_counts(depth)[:limit]
+    users = User.objects.in_bulk([user_id for user_id, _ in rows])
+    return [(users[user_id], downline) for user_id, downline in rows if user_id in users]
+
+
+def rebuild(batch_size=5000):
+    """Recreate every path from ReferredUser rows. Returns the number of paths written."""
+    parent = dict(ReferredUser.objects.values_list('referred_user_id', 'referred_by__user_id').iterator())
+    limit = max_depth()
+
+    ReferralPath.objects.all().delete()
+    written = 0
+    batch = []
+    for user_id, referrer_id in parent.items():
+        ancestor_id, depth = referrer_id, 1
+        while ancestor_id is not None and depth <= limit and ancestor_id != user_id:
+            batch.append(ReferralPath(ancestor_id=ancestor_id, descendant_id=user_id, depth=depth))
+            ancestor_id, depth = parent.get(ancestor_id), depth + 1
+        if len(batch) >= batch_size:
+            ReferralPath.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    ReferralPath.objects.bulk_create(batch, ignore_conflicts=True)
+    return written + len(batch)
@@ -0,0 +1,134 @@
+"""Write-behind buffer for game score submissions.
+
+With `SCORE_WRITE_BEHIND` enabled, `update_user_score` only records the
+score delta and best run in this process's buffer. A background thread
+flushes the buffer every `SCORE_FLUSH_INTERVAL` seconds (or as soon as it
+holds `SCORE_BUFFER_MAX_USERS` users, and at interpreter exit) as F()
+updates in a single transaction, so many runs by the same user cost one
+row write. An entry the database rejects (e.g. a total out of the column's
+range) is dropped and logged rather than holding back everyone else's.
+"""
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import DataError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from richSnake_app.models import ScoreEvent, User
+
+_lock = threading.Lock()
+_pending = {}  # user_id -> [score delta, best record]
+_flusher = None
+
+
+def is_enabled():
+    return getattr(settings, 'SCORE_WRITE_BEHIND', False)
+
+
+def add(user, delta, record):
+    """Buffer a game result for `user`. Scores are stored as ints, like the columns."""
+    delta, record = int(delta), int(record)
+    with _lock:
+        entry = _pending.setdefault(user.id, [0, record])
+        entry[0] += delta
+        entry[1] = max(entry[1], record)
+        full = len(_pending) >= getattr(settings, 'SCORE_BUFFER_MAX_USERS', 1000)
+    _start_flusher()
+    if full:
+        try:
+            flush()
+        except Exception as e:
+            # The entries are back in the buffer; the flusher thread retries them
+            print(f"[score buffer flush failed]: {e}")
+
+
+def has_pending(user_id):
+    """Whether `user_id` has results not yet written to the database."""
+    with _lock:
+        return user_id in _pending
+
+
+def merge_pending(user):
+    """Apply `user`'s unflushed delta and record to the instance, without saving."""
+    with _lock:
+        entry = _pending.get(user.id)
+        if entry is None:
+            return user
+        delta, record = entry
+    user.score += delta
+    user.record = max(user.record, record)
+    return user
+
+
+def flush():
+    """Write all buffered results to the database. Returns the number of users updated."""
+    from richSnake_app.leaderboard import record_change
+
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    applied, dropped = {}, set()
+    try:
+        with transaction.atomic():
+            for user_id, (delta, record) in pending.items():
+                try:
+                    with transaction.atomic():
+                        User.objects.filter(id=user_id).update(
+                            score=F('score') + delta,
+                            record=Greatest('record', Value(record)),
+                        )
+                except (DataError, OverflowError) as e:
+                    print(f"[score buffer dropped]: user {user_id}, delta {delta}, record {record}: {e}")
+                    dropped.add(user_id)
+                    continue
+                applied[user_id] = delta
+            ScoreEvent.objects.bulk_create([
+                ScoreEvent(user_id=user_id, delta=delta, source=ScoreEvent.Source.GAME)
+                for user_id, delta in applied.items()
+                if delta
+            ])
+    except Exception:
+        # Put the results back so the next flush retries them.
+        with _lock:
+            for user_id, (delta, record) in pending.items():
+                if user_id in dropped:
+                    continue
+                entry = _pending.setdefault(user_id, [0, record])
+                entry[0] += delta
+                entry[1] = max(entry[1], record)
+        raise
+
+    record_change(*User.objects.filter(id__in=applied).only('id', 'score', 'balance', 'is_superuser'))
+    return len(applied)
+
+
+def _run_flusher(stop):
+    interval = getattr(settings, 'SCORE_FLUSH_INTERVAL', 2)
+    while not stop.wait(interval):
+        try:
+            flush()
+        except Exception as e:
+            print(f"[score buffer flush failed]: {e}")
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+        stop = threading.Event()
+        _flusher = threading.Thread(target=_run_flusher, args=(stop,), name='score-buffer-flusher', daemon=True)
+        _flusher.start()
+
+    def shutdown():
+        stop.set()
+        flush()
+
+    atexit.register(shutdown)
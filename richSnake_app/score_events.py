@@ -0,0 +1,109 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+
+from richSnake_app.models import ScoreEvent, ScoreRollup
+
+Period = ScoreRollup.Period
+
+_TRUNCATE = {
+    Period.DAY: TruncDay,
+    Period.WEEK: TruncWeek,
+}
+
+
+def period_start(period, day):
+    """First day of the `period` containing `day`. Weeks start on Monday."""
+    if period == Period.WEEK:
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def log_score(user, delta, source):
+    """Append a score change for `user` to the event log."""
+    delta = int(round(delta))
+    if delta:
+        ScoreEvent.objects.create(user=user, delta=delta, source=source)
+
+
+def rollup(since, batch_size=1000):
+    """Recompute day and week rollups for every period from the one containing `since`.
+
+    Totals are rebuilt from the raw events, so running it again over the same
+    window is harmless. Returns the number of rollup rows written.
+    """
+    written = 0
+    for period, truncate in _TRUNCATE.items():
+        start = period_start(period, since)
+        totals = (ScoreEvent.objects
+                  .filter(created_at__gte=_start_of_day(start))
+                  .annotate(start=truncate('created_at', output_field=DateField()))
+                  .values('user_id', 'start')
+                  .annotate(total=Sum('delta'))
+                  .order_by())
+        rows = [
+            ScoreRollup(user_id=row['user_id'], period=period, period_start=row['start'], score=row['total'])
+            for row in totals.iterator()
+        ]
+        ScoreRollup.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['period', 'period_start', 'user'],
+            update_fields=['score'],
+        )
+        written += len(rows)
+    return written
+
+
+def prune_cutoff(retention_days, today=None):
+    """Oldest moment whose events must be kept.
+
+    Aligned to the start of a week, so every rollup period is either fully
+    pruned or fully kept and re-running `rollup` can never see a partial one.
+    """
+    today = today or timezone.localdate()
+    return _start_of_day(period_start(Period.WEEK, today - timedelta(days=retention_days)))
+
+
+def prune(retention_days, batch_size=5000):
+    """Delete raw events older than the retention window. Returns rows deleted."""
+    cutoff = prune_cutoff(retention_days)
+    oldest = ScoreEvent.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None or oldest >= cutoff:
+        return 0
+    # Make sure the periods being pruned are rolled up before their events go.
+    rollup(timezone.localtime(oldest).date())
+
+    deleted = 0
+    while True:
+        ids = list(ScoreEvent.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ScoreEvent.objects.filter(id__in=ids).delete()[0]
+
+
+def period_leaderboard(period, day=None, limit=100):
+    """Top rollups of the `period` containing `day` (today by default)."""
+    start = period_start(period, day or timezone.localdate())
+    return (ScoreRollup.objects
+            .filter(period=period, period_start=start, user__is_superuser=False)
+            .select_related('user')
+            .order_by('-score', 'user_id')[:limit])
+
+
+def period_rank(user, period, day=None):
+    """(rank, score) of `user` in the `period` containing `day`; rank is None without a rollup."""
+    start = period_start(period, day or timezone.localdate())
+    rollups = ScoreRollup.objects.filter(period=period, period_start=start)
+    own = rollups.filter(user=user).values_list('score', flat=True).first()
+    if own is None:
+        return None, 0
+    ahead = rollups.filter(score__gte=own).exclude(score=own, user_id__gte=user.id).count()
+    return ahead + 1, own
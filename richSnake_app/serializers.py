@@ -1,8 +1,26 @@
 from rest_framework import serializers
+from .images import image_url
 from .models import User, Referral, ReferredUser, Task, Prize, WithdrawRequest
 
 
+class DerivativeImageField(serializers.ImageField):
+    """ImageField that serves the derivative named by the `image_size` context entry."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        url = image_url(value, self.context.get('image_size'))
+        if url is None:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
 class UserSerializer(serializers.ModelSerializer):
+    avatar = DerivativeImageField()
+
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'score', 'balance', 'avatar', "wallet_address"]
@@ -16,7 +34,7 @@ class ReferralSerializer(serializers.ModelSerializer):
 
 class ReferredUserSerializer(serializers.ModelSerializer):
     user = serializers.CharField(source='referred_user.username')
-    image = serializers.ImageField(source='referred_user.avatar')
+    image = DerivativeImageField(source='referred_user.avatar')
     coin = serializers.IntegerField(source='earned_score')
 
     class Meta:
@@ -25,12 +43,16 @@ class ReferredUserSerializer(serializers.ModelSerializer):
 
 
 class TaskSerializer(serializers.ModelSerializer):
+    source_image = DerivativeImageField()
+
     class Meta:
         model = Task
         fields = "__all__"
 
 
 class PrizeSerializer(serializers.ModelSerializer):
+    image = DerivativeImageField()
+
     class Meta:
         model = Prize
         fields = '__all__'
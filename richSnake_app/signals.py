@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .catalog import invalidate_prizes, invalidate_tasks
+from .images import generate_derivatives
+from .models import Prize, Subscription, Task, User
+from .subscriptions import invalidate as invalidate_subscription
+
+
+@receiver(post_save, sender=Prize)
+def prize_image_derivatives(sender, instance, **kwargs):
+    if instance.image:
+        generate_derivatives(instance.image.name)
+
+
+@receiver(post_save, sender=Task)
+def task_image_derivatives(sender, instance, **kwargs):
+    if instance.source_image:
+        generate_derivatives(instance.source_image.name)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key, instance.user_id)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_catalog_changed(sender, instance, **kwargs):
+    invalidate_tasks()
+
+
+@receiver(post_save, sender=Prize)
+@receiver(post_delete, sender=Prize)
+def prize_catalog_changed(sender, instance, **kwargs):
+    invalidate_prizes()
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def drop_cached_subscription(sender, instance, **kwargs):
+    invalidate_subscription(instance.user_id)
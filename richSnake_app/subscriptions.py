@@ -0,0 +1,69 @@
+"""Subscription state with a per-user cache in front of the database.
+
+`get_state` is called on every mini app screen load, so the user's row is
+cached (including "no subscription") until it changes. Activity is judged
+against `expire_time` on read, so a cached entry never outlives the
+subscription it describes.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from richSnake_app.models import Subscription
+
+_MISSING = {'id': None, 'expire_time': None, 'active': False}
+
+
+def _cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _key(user_id):
+    return f"subscription:{user_id}"
+
+
+def get_state(user):
+    """{'id', 'expire_time', 'is_active'} for `user`; id is None without an active subscription."""
+    state = _cache().get(_key(user.pk))
+    if state is None:
+        subscription = (Subscription.objects.filter(user=user, active=True)
+                        .values('id', 'expire_time', 'active').first())
+        state = subscription or _MISSING
+        _cache().set(_key(user.pk), state, timeout=getattr(settings, 'SUBSCRIPTION_CACHE_TTL', 3600))
+    if state['id'] is None:
+        return {'id': None, 'expire_time': None, 'is_active': False}
+    return {'id': state['id'], 'expire_time': state['expire_time'], 'is_active': state['expire_time'] > timezone.now()}
+
+
+def grant(user, days):
+    """Start or replace `user`'s subscription so it runs `days` days from now."""
+    subscription, _ = Subscription.objects.update_or_create(
+        user=user,
+        defaults={'expire_time': timezone.now() + timezone.timedelta(days=days), 'active': True},
+    )
+    # After commit, so a concurrent read cannot cache the old row again
+    transaction.on_commit(lambda: invalidate(user.pk))
+    return subscription
+
+
+def deactivate_expired(batch_size=1000, now=None):
+    """Set active=False on subscriptions past expire_time, `batch_size` rows per UPDATE.
+
+    Returns the number of subscriptions deactivated.
+    """
+    now = now or timezone.now()
+    deactivated = 0
+    while True:
+        batch = list(Subscription.objects.filter(active=True, expire_time__lte=now)
+                     .order_by('expire_time').values_list('id', 'user_id')[:batch_size])
+        if not batch:
+            return deactivated
+        deactivated += Subscription.objects.filter(id__in=[sub_id for sub_id, _ in batch], active=True).update(active=False)
+        invalidate(*(user_id for _, user_id in batch))
+        if len(batch) < batch_size:
+            return deactivated
+
+
+def invalidate(*user_ids):
+    _cache().delete_many([_key(user_id) for user_id in user_ids])
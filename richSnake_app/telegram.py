@@ -0,0 +1,176 @@
+"""Telegram Bot API client.
+
+One pooled keep-alive session per process, a timeout on every call, bounded
+retries and per-method latency/error counters. `AsyncTelegramClient` offers
+the same calls to async (ASGI) views.
+"""
+import asyncio
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class TelegramError(Exception):
+    """The Bot API could not be reached or answered with ok=false."""
+
+    def __init__(self, method, description, status_code=None):
+        super().__init__(f"{method}: {description}")
+        self.method = method
+        self.description = description
+        self.status_code = status_code
+
+
+class Metrics:
+    """Thread-safe call counters and latency totals per Bot API method."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, method, seconds, error=False):
+        with self._lock:
+            stats = self._stats.setdefault(method, {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += error
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                method: dict(stats, avg_seconds=stats['total_seconds'] / stats['calls'])
+                for method, stats in self._stats.items()
+            }
+
+
+class TelegramClient:
+    def __init__(self, token, base_url='https://api.telegram.org', timeout=10, retries=2, pool_size=20):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.metrics = Metrics()
+
+        # Connection errors are retried for every method (nothing reached the
+        # server); read errors and 429/5xx only for GET, which is idempotent.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, name, http_method, url, timeout=None, **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.session.request(http_method, url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.metrics.record(name, time.monotonic() - started, error=True)
+            raise TelegramError(name, str(e))
+        self.metrics.record(name, time.monotonic() - started, error=not response.ok)
+        return response
+
+    def call(self, method, params=None, http_method='GET', timeout=None):
+        """Call a Bot API method and return its `result`."""
+        url = f"{self.base_url}/bot{self.token}/{method}"
+        if http_method == 'GET':
+            response = self._request(method, 'GET', url, timeout=timeout, params=params)
+        else:
+            response = self._request(method, http_method, url, timeout=timeout, json=params)
+        try:
+            data = response.json()
+        except ValueError:
+            raise TelegramError(method, f"Non-JSON response: {response.text[:200]}", response.status_code)
+        if not data.get('ok'):
+            raise TelegramError(method, data.get('description', 'Unknown error'), response.status_code)
+        return data['result']
+
+    def get_user_profile_photos(self, user_id, limit=1):
+        return self.call('getUserProfilePhotos', {'user_id': user_id, 'limit': limit})
+
+    def get_file(self, file_id):
+        return self.call('getFile', {'file_id': file_id})
+
+    def file_url(self, file_path):
+        return f"{self.base_url}/file/bot{self.token}/{file_path}"
+
+    def download(self, url):
+        """Bytes at `url`, e.g. a `file_url`."""
+        response = self._request('downloadFile', 'GET', url)
+        if not response.ok:
+            raise TelegramError('downloadFile', f"HTTP {response.status_code}", response.status_code)
+        return response.content
+
+    def create_invoice_link(self, **invoice):
+        return self.call('createInvoiceLink', invoice, http_method='POST')
+
+    def answer_pre_checkout_query(self, pre_checkout_query_id, ok=True, error_message=None):
+        params = {'pre_checkout_query_id': pre_checkout_query_id, 'ok': ok}
+        if error_message:
+            params['error_message'] = error_message
+        return self.call('answerPreCheckoutQuery', params, http_method='POST')
+
+    def get_updates(self, offset=None, limit=100, timeout=25, allowed_updates=None):
+        """Long-poll for up to `limit` updates, waiting up to `timeout` seconds for the first."""
+        params = {'limit': limit, 'timeout': timeout}
+        if offset is not None:
+            params['offset'] = offset
+        if allowed_updates is not None:
+            params['allowed_updates'] = allowed_updates
+        return self.call('getUpdates', params, http_method='POST', timeout=self.timeout + timeout)
+
+    def delete_webhook(self, drop_pending_updates=False):
+        return self.call('deleteWebhook', {'drop_pending_updates': drop_pending_updates}, http_method='POST')
+
+
+class AsyncTelegramClient:
+    """Awaitable wrapper around a `TelegramClient` for async views.
+
+    Calls run in the default thread pool so they share the sync client's
+    connection pool, timeouts, retries and metrics.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.metrics = client.metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        async def run(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return run
+
+
+@lru_cache(maxsize=4)
+def _client(token, base_url, timeout, retries):
+    return TelegramClient(token, base_url=base_url, timeout=timeout, retries=retries)
+
+
+def get_client(token=None):
+    """Process-wide client for `token` (the configured BOT_TOKEN by default)."""
+    return _client(
+        token if token is not None else settings.BOT_TOKEN,
+        getattr(settings, 'TELEGRAM_API_URL', 'https://api.telegram.org'),
+        getattr(settings, 'TELEGRAM_TIMEOUT', 10),
+        getattr(settings, 'TELEGRAM_RETRIES', 2),
+    )
+
+
+def get_async_client(token=None):
+    return AsyncTelegramClient(get_client(token))
@@ -0,0 +1,165 @@
+"""Local stand-in for the Telegram Bot API, for offline testing and benchmarks.
+
+    with StubBotAPI() as stub:
+        client = TelegramClient('123:abc', base_url=stub.url)
+        client.get_user_profile_photos(1)
+
+Point the app at it with TELEGRAM_API_URL, or run it standalone with the
+`telegram_stub_server` command.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# 1x1 transparent PNG served for every file download
+AVATAR_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489'
+    '0000000d4944415478da63606060600000000500017aa857500000000049454e44ae426082'
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            raw = self.rfile.read(length)
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params.update(json.loads(raw))
+            else:
+                params.update(parse_qsl(raw.decode()))
+        return url.path, params
+
+    def _handle(self):
+        stub = self.server.stub
+        path, params = self._params()
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        parts = path.strip('/').split('/')
+        if len(parts) >= 3 and parts[0] == 'file':
+            stub.record('downloadFile', params)
+            return self._send(200, AVATAR_BYTES, 'image/png')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return self._send(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        method = parts[1]
+        stub.record(method, params)
+        handler = stub.methods.get(method)
+        if handler is None:
+            return self._send(404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'})
+        self._send(200, {'ok': True, 'result': handler(params)})
+
+    do_GET = do_POST = _handle
+
+
+class StubBotAPI:
+    """Threaded HTTP server answering a subset of Bot API methods with canned data.
+
+    `methods` maps method names to callables taking the request params and
+    returning `result`; tests can replace or add entries. `calls` records
+    every (method, params) received. Updates queued with `push_update` are
+    served by a long-polling `getUpdates`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+        self._invoice_seq = 0
+        self._updates = []
+        self._update_seq = 0
+        self._new_update = threading.Condition(self._lock)
+        self.methods = {
+            'getMe': lambda params: {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'},
+            'getUserProfilePhotos': self._profile_photos,
+            'getFile': lambda params: {
+                'file_id': params.get('file_id'),
+                'file_unique_id': f"u{params.get('file_id')}",
+                'file_size': len(AVATAR_BYTES),
+                'file_path': f"photos/{params.get('file_id')}.jpg",
+            },
+            'createInvoiceLink': self._invoice_link,
+            'answerPreCheckoutQuery': lambda params: True,
+            'getUpdates': self._get_updates,
+            'deleteWebhook': lambda params: True,
+        }
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method, params):
+        with self._lock:
+            self.calls.append((method, params))
+
+    def _profile_photos(self, params):
+        user_id = params.get('user_id')
+        size = {'file_id': f"photo{user_id}", 'file_unique_id': f"uphoto{user_id}", 'width': 160, 'height': 160}
+        return {'total_count': 1, 'photos': [[size]]}
+
+    def _invoice_link(self, params):
+        with self._lock:
+            self._invoice_seq += 1
+            return f"https://t.me/$stub-invoice-{self._invoice_seq}"
+
+    def push_update(self, update):
+        """Queue `update` for getUpdates, assigning the next update_id. Returns the update."""
+        with self._new_update:
+            self._update_seq += 1
+            update = {'update_id': self._update_seq, **update}
+            self._updates.append(update)
+            self._new_update.notify_all()
+        return update
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), 5)
+        with self._new_update:
+            # Like the real API, an offset confirms (and forgets) every earlier update
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._new_update.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='telegram-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
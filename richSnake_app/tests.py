@@ -1,3 +1,254 @@
-from django.test import TestCase
+import random
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from richSnake_app import bot_updates, helpers, leaderboard_engine, score_buffer
+from richSnake_app.leaderboard import get_user_rank
+from richSnake_app.leaderboard_engine import LeaderboardEngine, SortedRankList
+from richSnake_app.models import BotPollState, BotUpdate, Payment, ScoreEvent, Subscription, User
+from richSnake_app.telegram_stub import StubBotAPI
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'users': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'users'},
+}
+
+
+class SortedRankListTests(SimpleTestCase):
+    def test_matches_sorted_list_under_random_operations(self):
+        rng = random.Random(2)
+        ranks = SortedRankList(((rng.randint(0, 50), i) for i in range(40)), load=4)
+        expected = sorted(ranks)
+        next_id = 40
+        for _ in range(2000):
+            if expected and rng.random() < 0.45:
+                item = expected.pop(rng.randrange(len(expected)))
+                ranks.remove(item)
+            else:
+                item = (rng.randint(0, 50), next_id)
+                next_id += 1
+                expected.append(item)
+                expected.sort()
+                ranks.add(item)
+
+            self.assertEqual(len(ranks), len(expected))
+            if expected:
+                probe = rng.randrange(len(expected))
+                self.assertEqual(ranks[probe], expected[probe])
+                self.assertEqual(ranks.index(expected[probe]), probe)
+                self.assertEqual(list(ranks.islice(probe, probe + 7)), expected[probe:probe + 7])
+        self.assertEqual(list(ranks), expected)
+
+    def test_missing_items(self):
+        ranks = SortedRankList([(1, 1), (2, 2)], load=1)
+        with self.assertRaises(ValueError):
+            ranks.index((1, 2))
+        with self.assertRaises(ValueError):
+            ranks.remove((3, 3))
+        with self.assertRaises(IndexError):
+            ranks[2]
+
+
+class LeaderboardEngineTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.users = [
+            User.objects.create(telegram_id=str(i), score=rng.randint(0, 20), balance=rng.randint(0, 5))
+            for i in range(60)
+        ]
+        self.engine = LeaderboardEngine()
+        self.engine.build()
+
+    def assertRanksMatchDatabase(self):
+        for field in ('score', 'balance'):
+            ordered = list(User.objects.order_by(f'-{field}', 'id'))
+            for position, user in enumerate(ordered, start=1):
+                self.assertEqual(self.engine.rank(user.id, field), position)
+                self.assertEqual(get_user_rank(user, field), position)
+
+    def test_ranks_follow_database_ordering(self):
+        self.assertRanksMatchDatabase()
+        self.assertEqual(self.engine.check(), [])
+
+    def test_updates_keep_ranks_in_step(self):
+        for user in self.users[::7]:
+            User.objects.filter(id=user.id).update(score=15, balance=user.balance + 3)
+            user.refresh_from_db()
+            self.engine.update(user.id, score=user.score, balance=user.balance)
+        self.assertRanksMatchDatabase()
+        self.assertEqual(self.engine.check(), [])
+
+    def test_check_reports_drift(self):
+        User.objects.filter(id=self.users[0].id).update(score=999)
+        self.assertTrue(self.engine.check())
+
+
+@override_settings(SCORE_WRITE_BEHIND=True, SCORE_FLUSH_INTERVAL=3600, CACHES=LOCMEM_CACHES)
+class ScoreBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id='1', score=10, record=10)
+        self.other = User.objects.create(telegram_id='2')
+        self.addCleanup(score_buffer._pending.clear)
+
+    def test_runs_are_merged_then_flushed_once(self):
+        client = APIClient()
+        for score in (5, 30, 7.9):
+            client.force_authenticate(User.objects.get(id=self.user.id))
+            response = client.post('/update_user_score/', {'score': score}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['new_score'], 52)
+        self.assertEqual(User.objects.get(id=self.user.id).score, 10)
+
+        self.assertEqual(score_buffer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.score, self.user.record), (52, 30))
+        self.assertEqual(ScoreEvent.objects.get(user=self.user).delta, 42)
+        self.assertEqual(score_buffer.flush(), 0)
+
+    def test_out_of_range_scores_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for score in (1e30, 2 ** 31, -2 ** 31 - 1):
+            self.assertEqual(client.post('/update_user_score/', {'score': score}, format='json').status_code, 400)
+        self.assertEqual(score_buffer._pending, {})
+
+    def test_rejected_entry_does_not_hold_back_others(self):
+        score_buffer.add(self.user, 2 ** 63, 0)  # too big for any backend's column
+        score_buffer.add(self.other, 25, 25)
+
+        self.assertEqual(score_buffer.flush(), 1)
+        self.assertEqual(score_buffer._pending, {})
+        self.assertEqual(User.objects.get(id=self.user.id).score, 10)
+        self.assertEqual(User.objects.get(id=self.other.id).score, 25)
+
+    @override_settings(LEADERBOARD_IN_MEMORY=True)
+    @mock.patch.object(leaderboard_engine, 'start_maintenance')
+    @mock.patch.object(leaderboard_engine, 'engine', new_callable=LeaderboardEngine)
+    def test_rank_includes_buffered_score(self, engine, start_maintenance):
+        User.objects.create(telegram_id='3', score=50)
+        self.assertEqual(get_user_rank(self.user), 2)
+
+        score_buffer.add(self.user, 100, 100)
+        user = score_buffer.merge_pending(User.objects.get(id=self.user.id))
+        self.assertEqual(get_user_rank(user), 1)
+        self.assertEqual(engine.rank(self.user.id, 'score'), 2)
+
+
+@override_settings(BOT_TOKEN='1:test', CACHES=LOCMEM_CACHES)
+class BotUpdateTestCase(TestCase):
+    """Runs against a local StubBotAPI, so no network access is needed."""
+
+    def setUp(self):
+        self.stub = StubBotAPI().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(TELEGRAM_API_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(telegram_id='42')
+        self.payment = Payment.objects.create(user=self.user, amount=50, order_id='42')
+
+    def payment_update(self, **update):
+        return {**update, 'message': {'date': int(time.time()),
+                                      'successful_payment': {'invoice_payload': f'42&&&{self.payment.id}'}}}
+
+    def telegram_calls(self, method):
+        return [params for name, params in self.stub.calls if name == method]
+
+
+class InboxTests(BotUpdateTestCase):
+    def test_webhook_stores_each_update_once(self):
+        client = APIClient()
+        for _ in range(2):
+            response = client.post('/payment_status_webhook', {'update_id': 10, 'pre_checkout_query': {'id': 'q'}},
+                                   format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.post('/payment_status_webhook', {'message': {}}, format='json').status_code, 400)
+        self.assertEqual(BotUpdate.objects.count(), 1)
+        self.assertEqual(self.telegram_calls('answerPreCheckoutQuery'), [])
+
+    def test_processing_is_idempotent(self):
+        bot_updates.store([
+            {'update_id': 1, 'pre_checkout_query': {'id': 'q1'}},
+            self.payment_update(update_id=2),
+            self.payment_update(update_id=3),  # the same payment delivered again
+            {'update_id': 4, 'message': {'successful_payment': {'invoice_payload': 'junk'}}},
+        ])
+        invoice_key = helpers._invoice_cache_key(self.user.pk, self.payment.amount)
+        caches['users'].set(invoice_key, 'https://t.me/invoice')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(bot_updates.process_pending(), (4, 0))
+        self.assertEqual(bot_updates.process_pending(), (0, 0))
+        self.assertIsNone(caches['users'].get(invoice_key))
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.PaymentStatus.COMPLETED)
+        self.assertTrue(Subscription.objects.get(user=self.user).active)
+        self.assertEqual(len(self.telegram_calls('answerPreCheckoutQuery')), 1)
+        self.assertEqual(set(BotUpdate.objects.values_list('status', flat=True)), {BotUpdate.Status.DONE})
+
+    def test_updates_are_claimed_once(self):
+        bot_updates.store([{'update_id': i, 'message': {'text': 'hi'}} for i in range(1, 4)])
+        BotUpdate.objects.filter(update_id=2).update(status=BotUpdate.Status.PROCESSING)  # another worker's
+
+        self.assertEqual([row.update_id for row in bot_updates._claim(10)], [1, 3])
+        self.assertEqual(bot_updates._claim(10), [])
+
+    def test_failed_updates_are_retried_then_given_up(self):
+        del self.stub.methods['answerPreCheckoutQuery']
+        bot_updates.store([{'update_id': 1, 'pre_checkout_query': {'id': 'q1'}}])
+        for attempt in range(1, bot_updates.MAX_ATTEMPTS + 1):
+            self.assertEqual(bot_updates.process_pending(), (0, 1))
+            row = BotUpdate.objects.get()
+            self.assertEqual(row.attempts, attempt)
+        self.assertEqual(row.status, BotUpdate.Status.FAILED)
+        self.assertEqual(bot_updates.process_pending(), (0, 0))
+
+
+class PollerTests(BotUpdateTestCase):
+    def poller(self):
+        return bot_updates.Poller(timeout=0, retry_delay=0)
+
+    def test_polled_updates_go_through_the_inbox(self):
+        self.stub.push_update({'pre_checkout_query': {'id': 'q1'}})
+        pushed = self.stub.push_update(self.payment_update())
+        for _ in range(150):
+            self.stub.push_update({'message': {'date': int(time.time()), 'text': 'hi'}})
+
+        poller = self.poller()
+        self.assertEqual(poller.poll_once(), 100)
+        self.assertEqual(poller.poll_once(), 52)
+        self.assertEqual(poller.poll_once(), 0)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.PaymentStatus.COMPLETED)
+        self.assertTrue(BotUpdate.objects.filter(update_id=pushed['update_id']).exists())
+        counters = poller.counters()
+        self.assertEqual((counters['received'], counters['handled'], counters['failed']), (152, 152, 0))
+        self.assertEqual(counters['empty_polls'], 1)
+        self.assertEqual(BotPollState.objects.get().offset, 153)
+
+    def test_restart_resumes_from_saved_offset(self):
+        self.stub.push_update({'message': {'text': 'first'}})
+        self.assertEqual(self.poller().poll_once(), 1)
+        self.stub.push_update({'message': {'text': 'second'}})
+
+        poller = self.poller()
+        self.assertEqual(poller.poll_once(), 1)
+        self.assertEqual(self.telegram_calls('getUpdates')[-1]['offset'], 2)
+        self.assertEqual(BotUpdate.objects.count(), 2)
+
+    def test_stale_offset_is_not_sent(self):
+        # After a quiet week Telegram may restart update_ids below the saved offset
+        BotPollState.objects.create(name='getUpdates', offset=5000,
+                                    last_update_at=timezone.now() - timezone.timedelta(days=8))
+        self.stub.push_update({'message': {'text': 'after a quiet week'}})
+
+        self.assertEqual(self.poller().poll_once(), 1)
+        self.assertNotIn('offset', self.telegram_calls('getUpdates')[-1])
+        self.assertEqual(BotPollState.objects.get().offset, 2)
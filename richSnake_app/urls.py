@@ -1,16 +1,25 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import *  # Import the view function here
 
 urlpatterns = [
     path('user/', get_or_create_user, name='get_or_create_user'),  # Correctly reference the view here
     path('referred/', get_referral_list_of_user, name='get_referral_list_of_user'),
+    path('referral_downline/', referral_downline, name='referral_downline'),
+    path('top_referrers/', top_referrers_list, name='top_referrers_list'),
     path('get_mark_as_done_tasks/', get_mark_as_done_tasks, name='get_mark_as_done_tasks'),
     path('auth_view/', auth_view, name='auth_view'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('get_prizes_list/', get_prizes_list, name='get_prizes_list'),
     path('leaderboard_list/', leaderboard_list, name='leaderboard_list'),
     path('prizers_list/', prizers_list, name='prizers_list'),
+    path('leaderboard_around/', leaderboard_around, name='leaderboard_around'),
+    path('leaderboard_page/', leaderboard_page, name='leaderboard_page'),
+    path('leaderboard_check/', leaderboard_check, name='leaderboard_check'),
+    path('period_leaderboard_list/', period_leaderboard_list, name='period_leaderboard_list'),
     path('update_user_score/', update_user_score, name='update_user_score'),
     path('update_user_score_hard/', update_user_score_hard, name='update_user_score_hard'),
+    path('update_user_score_batch/', update_user_score_batch, name='update_user_score_batch'),
     path('subscription', get_user_subscription, name='get_user_subscription'),
     path('subscription/buy', buy_subscription, name='buy_subscription'),
     path('update_wallet_address', update_wallet_address, name='update_wallet_address'),
@@ -2,23 +2,39 @@ from django.conf import settings
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
-from richSnake_app.helpers import get_telegram_user_photo, validate_init_data
-from .models import Payment, User, Referral, ReferredUser, Task, UserTask, Prize, Subscription, WithdrawRequest
-from .serializers import UserSerializer, ReferredUserSerializer, TaskSerializer, PrizeSerializer, WithdrawRequestSerializer
-from django.shortcuts import get_object_or_404
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authentication import TokenAuthentication
+from richSnake_app.helpers import InitDataError, InitDataExpired, get_init_data_verifier
+from richSnake_app.jobs import enqueue
+from .models import User, Referral, ReferredUser, Task, UserTask, WithdrawRequest, ScoreEvent, ScoreRollup, Job
+from .serializers import UserSerializer, ReferredUserSerializer, WithdrawRequestSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from richSnake_app.authentication import CachedJWTAuthentication, CachedTokenAuthentication, issue_jwt, jwt_enabled
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.authtoken.models import Token
-import time
-import urllib.parse
-import requests
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
-import json
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from decimal import Decimal, InvalidOperation
+from richSnake_app import score_buffer
+from richSnake_app import catalog
+from richSnake_app.catalog import requested_language
 from richSnake_app.helpers import create_invoice
+from richSnake_app.images import requested_size
+from richSnake_app import leaderboard_engine
+from richSnake_app import referral_tree
+from richSnake_app import subscriptions
+from richSnake_app import bot_updates
+from richSnake_app.score_events import log_score, period_leaderboard, period_rank
+from richSnake_app.leaderboard import (
+    RANK_FIELDS, encode_cursor, get_user_rank, record_change, render_leaderboard, users_after, users_before
+)
+
+MAX_SCORE_BATCH = 500
+SCORE_MIN, SCORE_MAX = -2 ** 31, 2 ** 31 - 1  # IntegerField range
+REFERRAL_BONUS = 5000
 
 # Create update user, create token for user, create refferal code for user
 
@@ -31,28 +47,23 @@ def auth_view(request):
         BOT_TOKEN = settings.BOT_TOKEN
         print(BOT_TOKEN)
 
-        # Parse initData and extract hash and data
-        parsed_data = dict(urllib.parse.parse_qsl(init_data))
-
-        auth_date = int(parsed_data.get("auth_date", 0))
-        if time.time() - auth_date > 86400:  # 1-day expiry
+        # Parse and verify initData (1-day expiry); repeat launches hit the verifier's cache
+        try:
+            parsed_data = get_init_data_verifier(BOT_TOKEN).verify(init_data)
+        except InitDataExpired:
             return JsonResponse({"error": "Session expired"}, status=403)
-
-        if not validate_init_data(init_data, BOT_TOKEN):
+        except InitDataError:
             return JsonResponse({"error": "Invalid authentication data"}, status=403)
 
         # Auth data verified, process user info securely
-        user_data = json.loads(parsed_data['user'])
+        user_data = parsed_data['user']
 
         # Extract the id
         telegram_id = user_data.get("id")
         first_name = user_data.get("first_name", "")
         username = user_data.get("username", "")
 
-        # Fetch user's avatar photo
-        avatar_url = get_telegram_user_photo(telegram_id, BOT_TOKEN)
-
-        # Update or create user in the database with avatar URL
+        # Update or create user in the database
         user, user_created = User.objects.update_or_create(
             telegram_id=telegram_id,
             defaults={
@@ -60,34 +71,45 @@ def auth_view(request):
                 "username": username,
             }
         )
-        if avatar_url != None:
-            response = requests.get(avatar_url)
-            if response.status_code == 200:
-                # Use a unique name for the file to avoid conflicts
-                avatar_filename = f"{telegram_id}_avatar.jpg"
-                user.avatar.save(avatar_filename, ContentFile(response.content), save=True)
+        # Fetch user's avatar photo in the background
+        enqueue(Job.Kind.REFRESH_AVATAR, telegram_id)
 
         if user_created:
-            Subscription.objects.create(user=user, expire_time=timezone.now() + timezone.timedelta(days=500))
+            subscriptions.grant(user, days=500)
 
         referral_code = parsed_data.get("start_param")
         if referral_code:
             try:
                 # Find referrer based on referral_code
-                referrer = Referral.objects.get(referral_code=referral_code).user
+                referrer_referral = Referral.objects.select_related('user').get(referral_code=referral_code)
+                referrer = referrer_referral.user
                 if user_created:
                     # Create referral and referred user records
                     referral = Referral.objects.create(user=user)
-                    ReferredUser.objects.create(referred_by=referrer.referral, referred_user=user)
-                    referrer.score += 5000
-                    referrer.save()
+                    with transaction.atomic():
+                        referred = ReferredUser.objects.create(referred_by=referrer_referral, referred_user=user)
+                        referral_tree.add_referral(referrer, user)
+                        log_score(referrer, REFERRAL_BONUS, ScoreEvent.Source.REFERRAL)
+                        # The referrer's rows are shared by every signup through the code, so
+                        # touch them last and only with F() increments: the row locks are held
+                        # just until commit and concurrent signups never overwrite each other.
+                        Referral.objects.filter(pk=referrer_referral.pk).update(
+                            referred_count=F('referred_count') + 1,
+                            earned_score_total=F('earned_score_total') + referred.earned_score,
+                        )
+                        User.objects.filter(pk=referrer.pk).update(score=F('score') + REFERRAL_BONUS)
+                    referrer.refresh_from_db(fields=['score', 'balance'])
+                    record_change(referrer)
 
                     # Create a token for the user
                     token, _ = Token.objects.get_or_create(user=user)
-                    return Response({
+                    data = {
                         'message': 'User created with referral, referrer earned 10 points, token also created',
                         "token": token.key
-                    }, status=status.HTTP_201_CREATED)
+                    }
+                    if jwt_enabled():
+                        data.update(issue_jwt(user))
+                    return Response(data, status=status.HTTP_201_CREATED)
 
             except Referral.DoesNotExist:
                 return Response({'error': 'Invalid referral code'}, status=status.HTTP_400_BAD_REQUEST)
@@ -97,22 +119,24 @@ def auth_view(request):
 
         # Generate a token (for example, a random string here)
         token, created = Token.objects.get_or_create(user=user)
+        data = {"token": token.key, "is_new_user": user_created}
+        if jwt_enabled():
+            # Signed access/refresh tokens; the authtoken key stays for older clients
+            data.update(issue_jwt(user))
 
-        return JsonResponse({"token": token.key, "is_new_user": user_created})
+        return JsonResponse(data)
 
     return JsonResponse({"error": "Invalid request"}, status=400)
 
 
 # get Logged User (Home page)
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_or_create_user(request):
     if request.method == 'GET':
-        try:
-            user = User.objects.get(telegram_id=request.user.telegram_id)
-        except User.DoesNotExist:
-            return Response({'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
+        score_buffer.merge_pending(user)
 
         data = {
             "id": user.id,
@@ -133,54 +157,100 @@ def get_or_create_user(request):
 
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_referral_list_of_user(request):
     user = request.user
     referral, created = Referral.objects.get_or_create(user=user)
 
-    referred_users = referral.referred_users.all()
-    total_score = sum([ru.earned_score for ru in referred_users])
-
-    serializer = ReferredUserSerializer(referred_users, many=True)
+    try:
+        limit = min(int(request.query_params.get('limit', 50)), 100)
+        cursor = request.query_params.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit <= 0:
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Newest first, keyset-paginated on id so every page costs the same
+    referred_users = referral.referred_users.select_related('referred_user').order_by('-id')
+    if cursor is not None:
+        referred_users = referred_users.filter(id__lt=cursor)
+    referred_users = list(referred_users[:limit])
+
+    serializer = ReferredUserSerializer(referred_users, many=True, context={'image_size': requested_size(request)})
     return Response({
         'referred_users': serializer.data,
-        'total_referral_score': total_score,
-        "referral_code_of_user": referral.referral_code
+        'referred_count': referral.referred_count,
+        'total_referral_score': referral.earned_score_total,
+        "referral_code_of_user": referral.referral_code,
+        'next_cursor': referred_users[-1].id if len(referred_users) == limit else None,
     })
 
-# Get task list &&& Mark as Done
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def referral_downline(request):
+    # Users brought in per level of the referral tree, from one aggregate query
+    downline = referral_tree.downline_by_depth(request.user)
+    return Response({
+        'downline': [{'depth': depth, 'count': downline.get(depth, 0)}
+                     for depth in range(1, referral_tree.max_depth() + 1)],
+        'downline_total': sum(downline.values()),
+    })
 
 
-@api_view(['GET', 'POST'])
-@authentication_classes([TokenAuthentication])
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_mark_as_done_tasks(request):
-    if request.method == 'GET':
-        user = get_object_or_404(User, telegram_id=request.user.telegram_id)
+def top_referrers_list(request):
+    try:
+        limit = min(int(request.query_params.get('limit', 100)), 100)
+        depth = request.query_params.get('depth')
+        depth = int(depth) if depth else None
+    except ValueError:
+        return Response({'error': 'Invalid limit or depth'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit <= 0 or (depth is not None and depth <= 0):
+        return Response({'error': 'Invalid limit or depth'}, status=status.HTTP_400_BAD_REQUEST)
+
+    context = {'image_size': requested_size(request)}
+    referrers = []
+    for user, downline in referral_tree.top_referrers(limit, depth):
+        entry = UserSerializer(user, context=context).data
+        entry['downline_total'] = downline
+        referrers.append(entry)
+    return Response({'top_referrers': referrers})
 
-        # Retrieve completed tasks
-        completed_tasks = Task.objects.filter(task_users__user=user)
+# Get task list &&& Mark as Done
 
-        # Retrieve incomplete tasks
-        incomplete_tasks = Task.objects.exclude(
-            id__in=completed_tasks.values_list('id', flat=True))
 
-        # Serialize both completed and incomplete tasks
-        completed_serializer = TaskSerializer(completed_tasks, many=True)
-        incomplete_serializer = TaskSerializer(incomplete_tasks, many=True)
+def _etag_response(request, etag, render):
+    """304 if the client's If-None-Match has `etag`, else the JSON body from `render()`."""
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(render(), content_type='application/json')
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Language'])
+    return response
 
-        # Return both lists in the response
-        return Response({
-            'completed_tasks': completed_serializer.data,
-            'incomplete_tasks': incomplete_serializer.data
-        })
+
+@api_view(['GET', 'POST'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def get_mark_as_done_tasks(request):
+    if request.method == 'GET':
+        # Pre-rendered catalog in the client's language, split by the user's completed task ids
+        lang, image_size = requested_language(request), requested_size(request)
+        etag, done = catalog.task_board_etag(request.user, lang, image_size)
+        return _etag_response(request, etag, lambda: catalog.render_task_board(done, lang, image_size))
 
     elif request.method == 'POST':
         task_id = int(request.data.get('task_id', 0))
 
         try:
-            user = User.objects.get(telegram_id=request.user.telegram_id)
+            user = request.user
             task = Task.objects.get(id=task_id)
 
             # Check if the task is already completed
@@ -192,130 +262,163 @@ def get_mark_as_done_tasks(request):
 
             if task.type == Task.Types.COIN:
                 # Update user's score
-                user.score += task.score
-                user.save()
+                User.objects.filter(id=user.id).update(score=F('score') + task.score)
+                log_score(user, task.score, ScoreEvent.Source.TASK)
             elif task.type == Task.Types.DOLLAR:
-                user.balance += task.score
-                user.save()
+                User.objects.filter(id=user.id).update(balance=F('balance') + task.score)
+            user.refresh_from_db(fields=['score', 'balance'])
+            record_change(user)
 
             return Response({'message': 'Task completed and score updated'}, status=status.HTTP_200_OK)
 
-        except User.DoesNotExist:
-            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         except Task.DoesNotExist:
             return Response({'error': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
 # Get Prizes List &&&
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_prizes_list(request):
-    prizes = Prize.objects.all()
-    serializer = PrizeSerializer(prizes, many=True)
-
-    return Response({
-        'prize_list': serializer.data
-    })
+    body, etag = catalog.prizes.get(requested_language(request), requested_size(request))
+    return _etag_response(request, etag, lambda: body)
 
 
 #  Get Leaderboard, user_rank, user
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def leaderboard_list(request):
-    users = User.objects.exclude(is_superuser=True).order_by('-score')[:100]
-    serializer = UserSerializer(users, many=True)
-
-    # Try to get the requesting user
-    try:
-        user = User.objects.get(telegram_id=request.user.telegram_id)
-    except User.DoesNotExist:
-        return Response({'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    user = request.user
+    score_buffer.merge_pending(user)
 
-    # Calculate user rank in the complete ordered queryset
-    full_ordered_users = User.objects.order_by('-score')
-    user_rank = list(full_ordered_users).index(user) + 1
+    # Cached top-100 snapshot plus the user's own rank and profile
+    return HttpResponse(render_leaderboard(user, 'score', requested_size(request)), content_type='application/json')
 
-    # Serialize the user's data
-    user_serializer = UserSerializer(user)
 
-    return Response({
-        'leaderBoard': serializer.data,
-        'user_rank': user_rank,
-        'user': user_serializer.data
-    })
+def _score_value(raw):
+    """Score from a request as an int, truncated like the score columns; None if not numeric or out of range."""
+    try:
+        value = int(float(raw))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not SCORE_MIN <= value <= SCORE_MAX:
+        return None
+    return value
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def update_user_score(request):
-    user = User.objects.get(telegram_id=request.user.telegram_id)
-    score_to_add = request.data.get('score', 0)
-    user.score += float(score_to_add)
-    if score_to_add > user.record:
-        user.record = score_to_add
-    user.save()
+    score_to_add = _score_value(request.data.get('score', 0))
+    if score_to_add is None:
+        return Response({'error': 'Invalid score value'}, status=status.HTTP_400_BAD_REQUEST)
+    if score_buffer.is_enabled():
+        # Buffered: the flusher applies the delta later, reply with the merged view
+        user = request.user
+        score_buffer.add(user, score_to_add, score_to_add)
+        score_buffer.merge_pending(user)
+        return Response({'message': 'User score updated', 'new_score': user.score})
+
+    user = request.user
+    User.objects.filter(id=user.id).update(
+        score=F('score') + score_to_add,
+        record=Greatest('record', Value(score_to_add)),
+    )
+    user.refresh_from_db(fields=['score', 'balance', 'record'])
+    record_change(user)
+    log_score(user, score_to_add, ScoreEvent.Source.GAME)
     return Response({'message': 'User score updated', 'new_score': user.score})
 
 
+# Apply many game sessions (e.g. replayed after going offline) in one write
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def update_user_score_batch(request):
+    sessions = request.data.get('sessions')
+    if not isinstance(sessions, list) or not sessions:
+        return Response({'error': 'sessions must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(sessions) > MAX_SCORE_BATCH:
+        return Response({'error': f'At most {MAX_SCORE_BATCH} sessions per batch'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        scores = [_score_value(session['score']) for session in sessions]
+    except (TypeError, KeyError):
+        scores = [None]
+    if None in scores:
+        return Response({'error': 'Every session needs a numeric score'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    with transaction.atomic():
+        User.objects.filter(id=user.id).update(
+            score=F('score') + sum(scores),
+            record=Greatest('record', Value(max(scores))),
+        )
+        log_score(user, sum(scores), ScoreEvent.Source.GAME)
+    user.refresh_from_db(fields=['score', 'balance', 'record'])
+    record_change(user)
+    score_buffer.merge_pending(user)
+
+    return Response({
+        'message': 'User score updated',
+        'sessions': len(scores),
+        'new_score': user.score,
+        'record': user.record,
+    })
+
+
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def update_user_score_hard(request):
     user = request.user
-    score_to_add = request.data.get('score', 0)
+    score_to_add = _score_value(request.data.get('score', 0))
     if score_to_add:
-        user.score = float(score_to_add)
-        user.save()
+        if score_buffer.is_enabled():
+            # Buffered deltas must land before the score is overwritten
+            score_buffer.flush()
+        with transaction.atomic():
+            # The logged delta needs the current score, not the cached user's
+            previous_score = User.objects.select_for_update().values_list('score', flat=True).get(id=user.id)
+            user.score = score_to_add
+            user.save(update_fields=['score'])
+            log_score(user, user.score - previous_score, ScoreEvent.Source.GAME_HARD)
+        record_change(user)
         return Response({'message': 'User score updated', 'new_score': user.score})
     return Response({'error': 'Invalid score value'}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user_subscription(request):
-    try:
-        user = request.user
-        subscription = Subscription.objects.filter(user=user, active=True).first()
-
-        if not subscription:
-            data = {
-                'id': None,
-                'expire_time': timezone.now(),
-                'is_active': False
-            }
-            return Response(data, status=status.HTTP_404_NOT_FOUND)
-        else:
-            data = {
-                'id': subscription.id,
-                'expire_time': subscription.expire_time,
-                'is_active': subscription.expire_time > timezone.now()
-            }
-        return Response(data, status=status.HTTP_200_OK)
-
-    except Subscription.DoesNotExist:
-        return Response({'error': 'Subscription not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Usually answered from the per-user cache without a query
+    state = subscriptions.get_state(request.user)
+    if state['id'] is None:
+        data = {
+            'id': None,
+            'expire_time': timezone.now(),
+            'is_active': False
+        }
+        return Response(data, status=status.HTTP_404_NOT_FOUND)
+    return Response(state, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def buy_subscription(request):
     user = request.user
     cost = 1  # Cost of the subscription
 
-    if user.balance >= cost:
-        user.balance -= cost
-        user.save()
-        Subscription.objects.filter(user=user).delete()
-        subscription = Subscription.objects.create(
-            user=user,
-            expire_time=timezone.now() + timezone.timedelta(days=30)
-        )
+    # Conditional decrement, so a stale cached balance can never overspend
+    if User.objects.filter(id=user.id, balance__gte=cost).update(balance=F('balance') - cost):
+        user.refresh_from_db(fields=['score', 'balance'])
+        record_change(user)
+        subscriptions.grant(user, days=30)
 
         return Response({'message': 'Subscription purchased successfully'}, status=status.HTTP_200_OK)
     else:
@@ -323,13 +426,14 @@ def buy_subscription(request):
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def buy_subscription_telegram(request):
     user = request.user
     try:
         invoice = create_invoice(user)
-        return Response(invoice, status=status.HTTP_200_OK)
+        # 202 while the link is still being created; asking again returns it
+        return Response(invoice, status=status.HTTP_202_ACCEPTED if invoice.get('pending') else status.HTTP_200_OK)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -339,99 +443,137 @@ def buy_subscription_telegram(request):
 @permission_classes([AllowAny])
 def payment_status_webhook(request):
     update = request.data
-    # Check if there is a successful payment in the update
-    if 'pre_checkout_query' in update:
-        print(f'[request.data]: {update}')
-        id = update.get('pre_checkout_query').get("id")
-        print(f'[pre checkout query]: {id}')
-        if id:
-            url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/answerPreCheckoutQuery"
-            data = {"pre_checkout_query_id": id, "ok": True}
-            res = requests.post(url, data=data)
-            print(f"[telegram bot response]: ", res.text)
-            return Response({"status": "success"})
-        print(f'[checkout query not found]')
-        return Response({"status": "success"})
-
-    elif 'successful_payment' in update.get("message", {}):
-        print(f'[request.data]: {update}')
-        order_id = update.get("message", {}).get("successful_payment", {}).get("invoice_payload")
-        print(f'[successful payment]: {order_id}')
-
-        # Update your payment record based on order ID
-        try:
-            user_tg_id = order_id.split("&&&")[0]
-            payment_id = int(order_id.split("&&&")[1])
-
-            payment = Payment.objects.get(order_id=user_tg_id, id=payment_id)
-            if payment.status == Payment.PaymentStatus.COMPLETED:
-                print(f'[payment already marked as paid]')
-                return Response({"status": "fail"})
-            else:
-                payment.status = Payment.PaymentStatus.COMPLETED
-                payment.save()
-        except Exception as e:
-            print("[error, data not valid]", str(e))
-            return Response({"status": "fail"})
-
-        try:
-            user = User.objects.get(telegram_id=user_tg_id)
-            Subscription.objects.filter(user=user).delete()
-            subscription = Subscription.objects.create(
-                user=user,
-                expire_time=timezone.now() + timezone.timedelta(days=30)
-            )
-            print(f"[purchase successfull]: {user.username} - {subscription.expire_time}")
-        except Exception as e:
-            print(f'[error]: User not found for order_id: {order_id}')
+    # Store the update and acknowledge at once; `process_bot_updates` handles it.
+    # Telegram redelivers unacknowledged updates, and the inbox drops repeats by update_id.
+    if not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+        print('[response]: {"status": "no update_id found"}')
+        return Response({"status": "no update_id found"}, status=400)
 
-        print('[response]: {"status": "success"}')
-        return Response({"status": "success"})
-    else:
-        print('[response]: {"status": "no payment update found"}')
-        return Response({"status": "no payment update found"}, status=400)
+    bot_updates.store([update])
+    return Response({"status": "success"})
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def update_wallet_address(request):
     user = request.user
     wallet_address = request.data.get('wallet_address', '')
     user.wallet_address = wallet_address
-    user.save()
+    user.save(update_fields=['wallet_address'])
     return Response({'message': 'Wallet address updated successfully'})
 
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def prizers_list(request):
-    users = User.objects.exclude(is_superuser=True).order_by('-balance')[:100]
-    serializer = UserSerializer(users, many=True)
+    user = request.user
+    score_buffer.merge_pending(user)
+
+    # Cached top-100 snapshot plus the user's own rank and profile
+    return HttpResponse(render_leaderboard(user, 'balance', requested_size(request)), content_type='application/json')
 
-    # Try to get the requesting user
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAdminUser])
+def leaderboard_check(request):
+    # Compares the in-memory leaderboard of the worker answering this request
+    if not leaderboard_engine.is_enabled():
+        return Response({'error': 'In-memory leaderboard is disabled'}, status=status.HTTP_404_NOT_FOUND)
+    leaderboard_engine.engine.ensure_fresh()
+    problems = leaderboard_engine.engine.check()
+    return Response({
+        **leaderboard_engine.engine.status(),
+        'problem_count': len(problems),
+        'problems': problems[:50],
+    })
+
+
+def _leaderboard_params(request, default_limit, max_limit):
+    field = request.query_params.get('field', 'score')
+    if field not in RANK_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(RANK_FIELDS)}")
+    limit = int(request.query_params.get('limit', default_limit))
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    return field, min(limit, max_limit)
+
+
+# Players directly above and below the requesting user
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def leaderboard_around(request):
     try:
-        user = User.objects.get(telegram_id=request.user.telegram_id)
-    except User.DoesNotExist:
-        return Response({'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        field, limit = _leaderboard_params(request, 10, 50)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Calculate user rank in the complete ordered queryset
-    full_ordered_users = User.objects.order_by('-balance')
-    user_rank = list(full_ordered_users).index(user) + 1
+    user = request.user
+    user_rank = get_user_rank(user, field)
+    above = users_before(user, field, limit)
+    window = above + [user] + users_after(field, encode_cursor(user, field), limit)
 
-    # Serialize the user's data
-    user_serializer = UserSerializer(user)
+    first_rank = user_rank - len(above)
+    entries = UserSerializer(window, many=True, context={'image_size': requested_size(request)}).data
+    for rank, entry in enumerate(entries, first_rank):
+        entry['rank'] = rank
 
     return Response({
-        'leaderBoard': serializer.data,
+        'leaderBoard': entries,
         'user_rank': user_rank,
-        'user': user_serializer.data
+        'next_cursor': encode_cursor(window[-1], field),
+    })
+
+
+# Full ranking, paged with an opaque cursor returned by the previous page
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def leaderboard_page(request):
+    try:
+        field, limit = _leaderboard_params(request, 50, 100)
+        users = users_after(field, request.query_params.get('cursor'), limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'leaderBoard': UserSerializer(users, many=True, context={'image_size': requested_size(request)}).data,
+        'next_cursor': encode_cursor(users[-1], field) if len(users) == limit else None,
+    })
+
+
+# Daily / weekly leaderboard, read from the score rollups
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def period_leaderboard_list(request):
+    period = request.query_params.get('period', ScoreRollup.Period.WEEK)
+    if period not in ScoreRollup.Period.values:
+        return Response({'error': f"period must be one of {', '.join(ScoreRollup.Period.values)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    rollups = period_leaderboard(period)
+    context = {'image_size': requested_size(request)}
+    leaderboard = []
+    for rollup in rollups:
+        entry = UserSerializer(rollup.user, context=context).data
+        entry['period_score'] = rollup.score
+        leaderboard.append(entry)
+
+    user_rank, user_score = period_rank(request.user, period)
+    return Response({
+        'period': period,
+        'leaderBoard': leaderboard,
+        'user_rank': user_rank,
+        'user_period_score': user_score,
     })
 
 
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def create_withdraw_request(request):
     """
@@ -472,29 +614,29 @@ def create_withdraw_request(request):
                 'error': 'Withdrawal amount must be positive'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if user has sufficient balance
-        if amount > user.balance:
-            return Response({
-                'error': 'Insufficient balance'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
         # Validate wallet address
         if not wallet_address:
             return Response({
                 'error': 'Wallet address is required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create withdrawal request
-        withdraw_request = WithdrawRequest.objects.create(
-            user=user,
-            amount=amount,
-            wallet_address=wallet_address,
-            status=WithdrawRequest.Status.PENDING
-        )
+        with transaction.atomic():
+            # Temporarily reduce user balance (to prevent multiple withdrawals);
+            # the balance check is part of the UPDATE so concurrent requests can't overdraw
+            if not User.objects.filter(id=user.id, balance__gte=amount).update(balance=F('balance') - amount):
+                return Response({
+                    'error': 'Insufficient balance'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Temporarily reduce user balance (to prevent multiple withdrawals)
-        user.balance -= amount
-        user.save()
+            # Create withdrawal request
+            withdraw_request = WithdrawRequest.objects.create(
+                user=user,
+                amount=amount,
+                wallet_address=wallet_address,
+                status=WithdrawRequest.Status.PENDING
+            )
+        user.refresh_from_db(fields=['score', 'balance'])
+        record_change(user)
 
         # Serialize and return the withdrawal request
         serializer = WithdrawRequestSerializer(withdraw_request)